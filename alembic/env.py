@@ -38,15 +38,18 @@ def do_run_migrations(connection):
 
 
 async def run_async_migrations() -> None:
-    """Асинхронный запуск миграций."""
-    connectable = async_engine_from_config(
-        config.get_section(config.config_ini_section, {}),
-        prefix="sqlalchemy.",
-        poolclass=pool.NullPool,
-    )
-    async with connectable.connect() as connection:
-        await connection.run_sync(do_run_migrations)
-    await connectable.dispose()
+    """Асинхронный запуск миграций на каждом шарде."""
+    for url in settings.SHARD_URLS:
+        section = config.get_section(config.config_ini_section, {})
+        section["sqlalchemy.url"] = url
+        connectable = async_engine_from_config(
+            section,
+            prefix="sqlalchemy.",
+            poolclass=pool.NullPool,
+        )
+        async with connectable.connect() as connection:
+            await connection.run_sync(do_run_migrations)
+        await connectable.dispose()
 
 
 def run_migrations_online() -> None:
@@ -0,0 +1,47 @@
+"""Create wallet_operations table
+
+Revision ID: 3b1f7c2d9a10
+Revises: 06ee55c83f16
+Create Date: 2026-10-19 10:12:31.402817
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '3b1f7c2d9a10'
+down_revision: Union[str, Sequence[str], None] = '06ee55c83f16'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('wallet_operations',
+    sa.Column('id', sa.BigInteger(), autoincrement=True, nullable=False),
+    sa.Column('wallet_id', sa.String(), nullable=False),
+    sa.Column('operation_type', sa.String(length=16), nullable=False),
+    sa.Column('amount', sa.Numeric(precision=12, scale=2), nullable=False),
+    sa.Column('balance_after', sa.Numeric(precision=12, scale=2), nullable=False),
+    sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=False),
+    sa.ForeignKeyConstraint(['wallet_id'], ['wallets.id'], ),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(
+        'ix_wallet_operations_history',
+        'wallet_operations',
+        ['wallet_id', 'created_at', 'id'],
+        unique=False,
+        postgresql_include=['operation_type', 'amount', 'balance_after'],
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index(
+        'ix_wallet_operations_history', table_name='wallet_operations'
+    )
+    op.drop_table('wallet_operations')
@@ -0,0 +1,31 @@
+"""Add wallet version column
+
+Revision ID: 8c4e2a6f1d37
+Revises: 3b1f7c2d9a10
+Create Date: 2026-10-19 11:40:08.215594
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '8c4e2a6f1d37'
+down_revision: Union[str, Sequence[str], None] = '3b1f7c2d9a10'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column(
+        'wallets',
+        sa.Column('version', sa.Integer(), server_default='0', nullable=False)
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_column('wallets', 'version')
@@ -0,0 +1,36 @@
+"""Stamp operations with insert time
+
+Revision ID: b4e8d2a6c9f1
+Revises: f7b2c9d4e6a3
+Create Date: 2026-10-19 21:12:37.402915
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b4e8d2a6c9f1'
+down_revision: Union[str, Sequence[str], None] = 'f7b2c9d4e6a3'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.alter_column(
+        'wallet_operations',
+        'created_at',
+        server_default=sa.text('clock_timestamp()'),
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.alter_column(
+        'wallet_operations',
+        'created_at',
+        server_default=sa.text('now()'),
+    )
@@ -0,0 +1,50 @@
+"""Create stats rollup tables
+
+Revision ID: c2d9e4b7a5f1
+Revises: 8c4e2a6f1d37
+Create Date: 2026-10-19 14:05:52.771203
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c2d9e4b7a5f1'
+down_revision: Union[str, Sequence[str], None] = '8c4e2a6f1d37'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('stats_rollups',
+    sa.Column('granularity', sa.String(length=8), nullable=False),
+    sa.Column('bucket_start', sa.DateTime(timezone=True), nullable=False),
+    sa.Column('deposits_count', sa.BigInteger(), nullable=False),
+    sa.Column('deposits_amount', sa.Numeric(precision=20, scale=2), nullable=False),
+    sa.Column('withdrawals_count', sa.BigInteger(), nullable=False),
+    sa.Column('withdrawals_amount', sa.Numeric(precision=20, scale=2), nullable=False),
+    sa.Column('active_wallets', sa.BigInteger(), nullable=False),
+    sa.PrimaryKeyConstraint('granularity', 'bucket_start')
+    )
+    op.create_table('stats_active_wallets',
+    sa.Column('granularity', sa.String(length=8), nullable=False),
+    sa.Column('bucket_start', sa.DateTime(timezone=True), nullable=False),
+    sa.Column('wallet_id', sa.String(), nullable=False),
+    sa.PrimaryKeyConstraint('granularity', 'bucket_start', 'wallet_id')
+    )
+    op.create_table('stats_watermark',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('last_operation_id', sa.BigInteger(), nullable=False),
+    sa.PrimaryKeyConstraint('id')
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_table('stats_watermark')
+    op.drop_table('stats_active_wallets')
+    op.drop_table('stats_rollups')
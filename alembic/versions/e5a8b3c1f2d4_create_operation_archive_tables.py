@@ -0,0 +1,52 @@
+"""Create operation archive tables
+
+Revision ID: e5a8b3c1f2d4
+Revises: c2d9e4b7a5f1
+Create Date: 2026-10-19 17:42:18.305614
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e5a8b3c1f2d4'
+down_revision: Union[str, Sequence[str], None] = 'c2d9e4b7a5f1'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('operation_archive_segments',
+    sa.Column('id', sa.BigInteger(), autoincrement=True, nullable=False),
+    sa.Column('path', sa.String(), nullable=False),
+    sa.Column('wallet_id_min', sa.String(collation='C'), nullable=False),
+    sa.Column('wallet_id_max', sa.String(collation='C'), nullable=False),
+    sa.Column('created_from', sa.DateTime(timezone=True), nullable=False),
+    sa.Column('created_to', sa.DateTime(timezone=True), nullable=False),
+    sa.Column('operation_id_min', sa.BigInteger(), nullable=False),
+    sa.Column('operation_id_max', sa.BigInteger(), nullable=False),
+    sa.Column('operations', sa.BigInteger(), nullable=False),
+    sa.Column('blocks', postgresql.JSONB(astext_type=sa.Text()), nullable=False),
+    sa.Column('archived_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=False),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('path')
+    )
+    op.create_index('ix_operation_archive_segments_wallets', 'operation_archive_segments', ['wallet_id_min', 'wallet_id_max'], unique=False)
+    op.create_table('wallet_archived_totals',
+    sa.Column('wallet_id', sa.String(), nullable=False),
+    sa.Column('net_amount', sa.Numeric(precision=20, scale=2), nullable=False),
+    sa.Column('operations', sa.BigInteger(), nullable=False),
+    sa.PrimaryKeyConstraint('wallet_id')
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_table('wallet_archived_totals')
+    op.drop_index('ix_operation_archive_segments_wallets', table_name='operation_archive_segments')
+    op.drop_table('operation_archive_segments')
@@ -0,0 +1,32 @@
+"""Create wallet import adjustments table
+
+Revision ID: f7b2c9d4e6a3
+Revises: e5a8b3c1f2d4
+Create Date: 2026-10-19 19:06:41.518207
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'f7b2c9d4e6a3'
+down_revision: Union[str, Sequence[str], None] = 'e5a8b3c1f2d4'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('wallet_import_adjustments',
+    sa.Column('wallet_id', sa.String(), nullable=False),
+    sa.Column('net_amount', sa.Numeric(precision=20, scale=2), nullable=False),
+    sa.PrimaryKeyConstraint('wallet_id')
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_table('wallet_import_adjustments')
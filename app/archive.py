@@ -0,0 +1,235 @@
+import asyncio
+import bisect
+import json
+import os
+import zlib
+from datetime import datetime, timezone
+from decimal import Decimal
+from pathlib import Path
+from typing import (
+    AsyncIterator,
+    Iterable,
+    List,
+    NamedTuple,
+    Optional,
+    Sequence,
+    Tuple,
+)
+
+from sqlalchemy import select, tuple_
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.config import settings
+from app.files import fsync_directory
+from app.models import OperationArchiveSegment
+
+# Строк в одном сжатом блоке сегмента: чтение истории кошелька
+# распаковывает только блоки, в которые попадает его wallet_id.
+BLOCK_ROWS = 1000
+
+# Строк индекса сегментов в одном запросе при чтении истории
+SEGMENT_PAGE = 100
+
+
+class ArchivedOperation(NamedTuple):
+    """Операция, прочитанная из архива."""
+
+    id: int
+    wallet_id: str
+    operation_type: str
+    amount: Decimal
+    balance_after: Decimal
+    created_at: datetime
+
+
+def _aware(value: Optional[datetime]) -> Optional[datetime]:
+    # Время без часового пояса считается UTC, как и в сессиях PostgreSQL
+    if value is not None and value.tzinfo is None:
+        return value.replace(tzinfo=timezone.utc)
+    return value
+
+
+def write_segment(
+    path: Path, operations: Sequence[ArchivedOperation]
+) -> List[Tuple[str, int, int]]:
+    """
+    Записать сегмент архива.
+
+    Операции должны быть отсортированы по (wallet_id, created_at, id).
+    Каждые BLOCK_ROWS строк NDJSON сжимаются отдельным членом gzip, так
+    что файл целиком читается обычным gunzip. Файл пишется под
+    временным именем и переименовывается после fsync: сегмент либо
+    записан полностью, либо отсутствует.
+
+    :return: Индекс блоков: (первый wallet_id, смещение, длина)
+    """
+    path.parent.mkdir(parents=True, exist_ok=True)
+    temporary = path.with_name(path.name + ".tmp")
+    blocks = []
+    offset = 0
+    with open(temporary, "wb") as stream:
+        for start in range(0, len(operations), BLOCK_ROWS):
+            block = operations[start:start + BLOCK_ROWS]
+            data = "".join(
+                json.dumps(
+                    [
+                        op.id, op.wallet_id, op.operation_type,
+                        str(op.amount), str(op.balance_after),
+                        op.created_at.isoformat(),
+                    ],
+                    separators=(",", ":"),
+                ) + "\n"
+                for op in block
+            ).encode()
+            compressor = zlib.compressobj(wbits=31)
+            compressed = compressor.compress(data) + compressor.flush()
+            stream.write(compressed)
+            blocks.append((block[0].wallet_id, offset, len(compressed)))
+            offset += len(compressed)
+        stream.flush()
+        os.fsync(stream.fileno())
+    os.replace(temporary, path)
+    fsync_directory(path.parent)
+    return blocks
+
+
+def read_segment_wallet(
+    path: Path, blocks: Sequence[Sequence], wallet_id: str
+) -> List[ArchivedOperation]:
+    """Прочитать из сегмента операции одного кошелька."""
+    firsts = [block[0] for block in blocks]
+    # Операции кошелька могут начинаться в блоке, первая строка которого
+    # относится к предыдущему кошельку.
+    index = max(bisect.bisect_left(firsts, wallet_id) - 1, 0)
+    operations = []
+    with open(path, "rb") as stream:
+        while index < len(blocks) and firsts[index] <= wallet_id:
+            _, offset, length = blocks[index]
+            stream.seek(offset)
+            data = zlib.decompress(stream.read(length), wbits=31)
+            for line in data.splitlines():
+                row = json.loads(line)
+                if row[1] == wallet_id:
+                    operations.append(
+                        ArchivedOperation(
+                            row[0], row[1], row[2], Decimal(row[3]),
+                            Decimal(row[4]), datetime.fromisoformat(row[5]),
+                        )
+                    )
+            index += 1
+    return operations
+
+
+async def _segments(session: AsyncSession, query) -> AsyncIterator:
+    # Индекс сегментов читается страницами от новых к старым, чтобы не
+    # загружать его целиком, когда нужна только первая страница истории.
+    last = None
+    while True:
+        page = query
+        if last is not None:
+            page = page.where(
+                tuple_(
+                    OperationArchiveSegment.created_to,
+                    OperationArchiveSegment.id,
+                )
+                < last
+            )
+        rows = (await session.execute(page.limit(SEGMENT_PAGE))).all()
+        for row in rows:
+            yield row
+        if len(rows) < SEGMENT_PAGE:
+            return
+        last = (rows[-1].created_to, rows[-1].id)
+
+
+async def read_archived_operations(
+    sessions: Iterable[AsyncSession],
+    wallet_id: str,
+    limit: int,
+    after: Optional[Tuple[datetime, int]] = None,
+    operation_type: Optional[str] = None,
+    created_from: Optional[datetime] = None,
+    created_to: Optional[datetime] = None,
+) -> List[ArchivedOperation]:
+    """
+    Получить страницу архивной истории кошелька, от новых к старым.
+
+    Индексы сегментов читаются со всех шардов: после переноса кошелька
+    на другой шард его архив остается в сегментах прежнего шарда.
+    Сегменты просматриваются по убыванию created_to; просмотр
+    останавливается, как только набрано limit операций, а следующий
+    сегмент целиком старше последней из них.
+    Параметры совпадают с WalletRepository.list_operations.
+    """
+    created_from, created_to = _aware(created_from), _aware(created_to)
+    query = (
+        select(
+            OperationArchiveSegment.id,
+            OperationArchiveSegment.path,
+            OperationArchiveSegment.created_to,
+        )
+        .where(
+            OperationArchiveSegment.wallet_id_min <= wallet_id,
+            OperationArchiveSegment.wallet_id_max >= wallet_id,
+        )
+        .order_by(
+            OperationArchiveSegment.created_to.desc(),
+            OperationArchiveSegment.id.desc(),
+        )
+    )
+    if after is not None:
+        query = query.where(OperationArchiveSegment.created_from <= after[0])
+    if created_from is not None:
+        query = query.where(
+            OperationArchiveSegment.created_to >= created_from
+        )
+    if created_to is not None:
+        query = query.where(OperationArchiveSegment.created_from < created_to)
+
+    # Текущий сегмент каждого шарда: (сегмент, сессия, поток)
+    heads = []
+    for session in sessions:
+        stream = _segments(session, query)
+        try:
+            heads.append([await stream.__anext__(), session, stream])
+        except StopAsyncIteration:
+            pass
+
+    archive_dir = Path(settings.ARCHIVE_DIR)
+    operations: List[ArchivedOperation] = []
+    while heads:
+        head = max(heads, key=lambda item: item[0].created_to)
+        segment, session, stream = head
+        if (
+            len(operations) >= limit
+            and segment.created_to < operations[limit - 1].created_at
+        ):
+            break
+
+        blocks = await session.scalar(
+            select(OperationArchiveSegment.blocks).where(
+                OperationArchiveSegment.id == segment.id
+            )
+        )
+        found = await asyncio.to_thread(
+            read_segment_wallet, archive_dir / segment.path, blocks, wallet_id
+        )
+        operations += [
+            op
+            for op in found
+            if (after is None or (op.created_at, op.id) < tuple(after))
+            and (operation_type is None or op.operation_type == operation_type)
+            and (created_from is None or op.created_at >= created_from)
+            and (created_to is None or op.created_at < created_to)
+        ]
+        operations.sort(key=lambda op: (op.created_at, op.id), reverse=True)
+        del operations[limit:]
+
+        try:
+            head[0] = await stream.__anext__()
+        except StopAsyncIteration:
+            heads.remove(head)
+
+    for _, _, stream in heads:
+        await stream.aclose()
+    return operations
@@ -0,0 +1,106 @@
+import csv
+import json
+import sys
+from decimal import Decimal, InvalidOperation
+from typing import Dict, Iterator, List, Tuple
+
+# Ограничение столбца balance NUMERIC(12, 2)
+MAX_BALANCE = Decimal("9999999999.99")
+
+
+class ImportErrorLimit(Exception):
+    """Превышено допустимое количество некорректных строк."""
+
+
+def parse_balance(value) -> Decimal:
+    """
+    Проверить и преобразовать баланс.
+
+    :raises ValueError: Если баланс не число, отрицательный, содержит
+    больше 2 знаков после запятой или не помещается в NUMERIC(12, 2)
+    """
+    try:
+        balance = Decimal(str(value).strip())
+    except InvalidOperation:
+        raise ValueError(f"invalid balance {value!r}")
+    if not balance.is_finite():
+        raise ValueError(f"invalid balance {value!r}")
+    if balance < 0:
+        raise ValueError("balance must not be negative")
+    if balance.as_tuple().exponent < -2:
+        raise ValueError("balance must have at most 2 decimal places")
+    if balance > MAX_BALANCE:
+        raise ValueError("balance is too large")
+    return balance
+
+
+def parse_wallet_id(value) -> str:
+    """Проверить идентификатор кошелька."""
+    if not isinstance(value, str) or not value.strip():
+        raise ValueError("wallet_id must be a non-empty string")
+    return value.strip()
+
+
+def read_csv(stream) -> Iterator[Tuple[int, object, object]]:
+    """Читать строки CSV (заголовок wallet_id,balance необязателен)."""
+    for line_no, row in enumerate(csv.reader(stream), 1):
+        if not row:
+            continue
+        if line_no == 1 and [c.strip().lower() for c in row] == [
+            "wallet_id", "balance"
+        ]:
+            continue
+        if len(row) != 2:
+            yield line_no, None, None
+            continue
+        yield line_no, row[0], row[1]
+
+
+def read_ndjson(stream) -> Iterator[Tuple[int, object, object]]:
+    """Читать строки NDJSON вида {"wallet_id": ..., "balance": ...}."""
+    for line_no, line in enumerate(stream, 1):
+        if not line.strip():
+            continue
+        try:
+            record = json.loads(line, parse_float=Decimal)
+        except json.JSONDecodeError:
+            yield line_no, None, None
+            continue
+        if not isinstance(record, dict):
+            yield line_no, None, None
+            continue
+        yield line_no, record.get("wallet_id"), record.get("balance")
+
+
+def validated_chunks(
+    rows: Iterator[Tuple[int, object, object]],
+    chunk_size: int,
+    max_errors: int,
+) -> Iterator[List[Tuple[str, Decimal]]]:
+    """
+    Проверить строки и сгруппировать их в пачки.
+
+    Повторы wallet_id внутри пачки схлопываются (побеждает последняя
+    строка): INSERT ... ON CONFLICT не может изменить строку дважды.
+    Память ограничена размером пачки.
+    """
+    errors = 0
+    chunk: Dict[str, Decimal] = {}
+    for line_no, wallet_id, balance in rows:
+        try:
+            if wallet_id is None and balance is None:
+                raise ValueError("malformed row")
+            chunk[parse_wallet_id(wallet_id)] = parse_balance(balance)
+        except ValueError as e:
+            errors += 1
+            print(f"Строка {line_no}: {e}", file=sys.stderr)
+            if errors > max_errors:
+                raise ImportErrorLimit(
+                    f"Некорректных строк больше {max_errors}"
+                )
+            continue
+        if len(chunk) >= chunk_size:
+            yield list(chunk.items())
+            chunk = {}
+    if chunk:
+        yield list(chunk.items())
@@ -0,0 +1,138 @@
+import asyncio
+import json
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Dict, List, Optional, Set
+
+import asyncpg
+
+from app.config import settings
+from app.sharding import asyncpg_dsns
+from app.version_cache import WalletVersionCache
+
+
+class BalanceBroadcaster:
+    """
+    Рассылка изменений баланса подписчикам внутри процесса.
+
+    Одно соединение с каждым шардом PostgreSQL слушает канал LISTEN, куда
+    update_balance пишет NOTIFY при коммите, и раздает уведомления
+    в очереди подписчиков. Очереди ограничены: если клиент не успевает
+    читать, самое старое событие вытесняется - для баланса важно только
+    последнее значение, поэтому медленный клиент не тормозит остальных
+    и не накапливает память.
+
+    Попутно ведется карта версий кошельков (versions): пока соединение
+    слушает канал, она отражает все коммиты и позволяет отвечать на
+    условные GET без обращения к БД.
+    """
+
+    def __init__(
+        self,
+        dsns: List[str],
+        channel: str,
+        queue_size: int,
+        version_cache_size: int,
+    ):
+        self.dsns = dsns
+        self.channel = channel
+        self.queue_size = queue_size
+        self.versions = WalletVersionCache(version_cache_size)
+        self._subscribers: Dict[str, Set[asyncio.Queue]] = {}
+        self._conns: List[asyncpg.Connection] = []
+        self._lock = asyncio.Lock()
+
+    @property
+    def is_listening(self) -> bool:
+        """Слушает ли процесс канал уведомлений всех шардов прямо сейчас."""
+        return len(self._conns) == len(self.dsns) and not any(
+            conn.is_closed() for conn in self._conns
+        )
+
+    async def start(self) -> None:
+        """Открыть соединения и подписаться на канал (если еще нет)."""
+        async with self._lock:
+            if self.is_listening:
+                return
+            await self._close_connections()
+            conns = []
+            try:
+                for dsn in self.dsns:
+                    conn = await asyncpg.connect(dsn)
+                    conns.append(conn)
+                    conn.add_termination_listener(self._on_terminate)
+                    await conn.add_listener(self.channel, self._on_notify)
+            except Exception:
+                for conn in conns:
+                    await conn.close()
+                raise
+            # Уведомления до подписки потеряны - начинаем карту заново
+            self.versions.clear()
+            self._conns = conns
+
+    async def stop(self) -> None:
+        """Закрыть соединения и завершить все подписки."""
+        async with self._lock:
+            await self._close_connections()
+            self.versions.clear()
+            self._close_subscribers()
+
+    async def _close_connections(self) -> None:
+        conns, self._conns = self._conns, []
+        for conn in conns:
+            if not conn.is_closed():
+                await conn.close()
+
+    @asynccontextmanager
+    async def subscribe(self, wallet_id: str) -> AsyncIterator[asyncio.Queue]:
+        """
+        Подписаться на изменения баланса кошелька.
+
+        Очередь получает словари с полями уведомления. None в очереди
+        означает, что соединение LISTEN потеряно и поток нужно закрыть:
+        клиент переподключится и получит актуальное состояние.
+        """
+        await self.start()
+        queue: asyncio.Queue = asyncio.Queue(maxsize=self.queue_size)
+        self._subscribers.setdefault(wallet_id, set()).add(queue)
+        try:
+            yield queue
+        finally:
+            queues = self._subscribers.get(wallet_id)
+            if queues is not None:
+                queues.discard(queue)
+                if not queues:
+                    del self._subscribers[wallet_id]
+
+    def subscriber_count(self) -> int:
+        """Количество активных подписок."""
+        return sum(len(queues) for queues in self._subscribers.values())
+
+    def _on_notify(self, conn, pid, channel, payload: str) -> None:
+        event = json.loads(payload)
+        self.versions.update(event["wallet_id"], event["version"])
+        for queue in self._subscribers.get(event["wallet_id"], ()):
+            self._offer(queue, event)
+
+    def _on_terminate(self, conn) -> None:
+        # Потеря любого из соединений означает пропущенные уведомления
+        self.versions.clear()
+        self._close_subscribers()
+
+    def _close_subscribers(self) -> None:
+        for queues in self._subscribers.values():
+            for queue in queues:
+                self._offer(queue, None)
+
+    @staticmethod
+    def _offer(queue: asyncio.Queue, event: Optional[dict]) -> None:
+        if queue.full():
+            queue.get_nowait()
+        queue.put_nowait(event)
+
+
+broadcaster = BalanceBroadcaster(
+    dsns=asyncpg_dsns(settings.SHARD_URLS),
+    channel=settings.BALANCE_CHANNEL,
+    queue_size=settings.BALANCE_STREAM_QUEUE_SIZE,
+    version_cache_size=settings.ETAG_CACHE_SIZE,
+)
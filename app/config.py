@@ -1,3 +1,5 @@
+from typing import List, Literal
+
 from pydantic_settings import BaseSettings, SettingsConfigDict
 
 
@@ -18,9 +20,78 @@ class Settings(BaseSettings):
             f"{self.POSTGRES_PORT}/{self.POSTGRES_DB}"
         )
 
+    # Шардирование: список строк подключения через запятую. Пустое
+    # значение - одна база из POSTGRES_*. Новые шарды добавляются только
+    # в конец списка: имя шарда определяется его позицией.
+    SHARD_DATABASE_URLS: str = ""
+
+    @property
+    def SHARD_URLS(self) -> List[str]:
+        urls = [
+            url.strip()
+            for url in self.SHARD_DATABASE_URLS.split(",")
+            if url.strip()
+        ]
+        return urls or [self.DATABASE_URL]
+
     PROJECT_NAME: str = "Wallet API"
     API_V1_STR: str = "/api/v1"
 
+    # Режим защиты от параллельных изменений баланса:
+    # pessimistic - SELECT FOR UPDATE, optimistic - сравнение версии
+    # (compare-and-swap) с ограниченным числом повторов при конфликте.
+    WALLET_UPDATE_MODE: Literal["pessimistic", "optimistic"] = "pessimistic"
+    OPTIMISTIC_MAX_RETRIES: int = 5
+
+    # Логирование SQL: echo выводит каждый запрос и годится только
+    # для отладки, в остальных случаях пишутся лишь медленные запросы.
+    # Отрицательный порог отключает логгер медленных запросов.
+    SQL_ECHO: bool = False
+    SLOW_QUERY_THRESHOLD_MS: float = 200.0
+    SLOW_QUERY_SAMPLE_RATE: float = 1.0
+    SLOW_QUERY_LOG_PARAMETERS: bool = False
+
+    # Профилировщик «горячих» кошельков: число отслеживаемых кошельков
+    # и скользящий интервал из HOT_WALLETS_WINDOWS окон.
+    HOT_WALLETS_CAPACITY: int = 100
+    HOT_WALLETS_WINDOW_SECONDS: float = 60.0
+    HOT_WALLETS_WINDOWS: int = 5
+
+    # Поток изменений баланса (SSE): канал LISTEN/NOTIFY, размер очереди
+    # подписчика и интервал keepalive-комментариев.
+    BALANCE_CHANNEL: str = "wallet_balance"
+    BALANCE_STREAM_QUEUE_SIZE: int = 16
+    BALANCE_STREAM_KEEPALIVE_SECONDS: float = 15.0
+
+    # Количество кошельков в карте версий для ответов 304 Not Modified
+    ETAG_CACHE_SIZE: int = 100_000
+
+    # Агрегаты статистики (/api/v1/stats) пересчитываются фоновой задачей
+    # раз в STATS_AGGREGATION_INTERVAL_SECONDS (0 - задача не запускается).
+    # Операции моложе STATS_AGGREGATION_LAG_SECONDS ждут следующего
+    # прохода; от транзакций, закоммиченных не по порядку, агрегатор
+    # защищен независимо от этой задержки (см. app/stats.py).
+    STATS_AGGREGATION_INTERVAL_SECONDS: float = 10.0
+    STATS_AGGREGATION_LAG_SECONDS: float = 5.0
+    STATS_AGGREGATION_BATCH_SIZE: int = 10_000
+
+    # Архив истории операций: операции старше ARCHIVE_RETENTION_DAYS
+    # суток переносятся скриптом archive_operations.py в сжатые сегменты
+    # в каталоге ARCHIVE_DIR (общем для всех экземпляров приложения).
+    ARCHIVE_DIR: str = "archive"
+    ARCHIVE_RETENTION_DAYS: int = 90
+    ARCHIVE_SEGMENT_SIZE: int = 100_000
+
+    # Хранилище балансов: postgres - SQLAlchemy и PostgreSQL, memory -
+    # память процесса с журналом упреждающей записи в MEMORY_DATA_DIR
+    # (без внешних зависимостей; история операций и статистика
+    # в этом режиме недоступны).
+    STORAGE_BACKEND: Literal["postgres", "memory"] = "postgres"
+    MEMORY_DATA_DIR: str = "data"
+    MEMORY_WAL_FSYNC: bool = True
+    MEMORY_SNAPSHOT_EVERY: int = 100_000
+    MEMORY_LOCK_STRIPES: int = 1024
+
     model_config = SettingsConfigDict(env_file=".env")
 
 
@@ -1,23 +1,35 @@
-from sqlalchemy.ext.asyncio import (
-    AsyncSession, async_sessionmaker, create_async_engine
-)
+from typing import AsyncGenerator
+
+from fastapi import Request
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import declarative_base
 
 from app.config import settings
+from app.query_logger import install_slow_query_logger
+from app.sharding import ShardRouter
 
-engine = create_async_engine(settings.DATABASE_URL, echo=True, future=True)
-
-AsyncSessionLocal = async_sessionmaker(
-    bind=engine, class_=AsyncSession, expire_on_commit=False, autoflush=False
+shard_router = ShardRouter(
+    settings.SHARD_URLS, echo=settings.SQL_ECHO, future=True
 )
+for _shard_engine in shard_router.engines.values():
+    install_slow_query_logger(_shard_engine.sync_engine)
+
+# Движок и фабрика сессий шарда по умолчанию (единственного, если
+# шардирование не настроено)
+engine = shard_router.engines[shard_router.default_shard]
+AsyncSessionLocal = shard_router.sessionmakers[shard_router.default_shard]
 
 Base = declarative_base()
 
 
-async def get_db() -> AsyncSession:
+async def get_db(request: Request) -> AsyncGenerator[AsyncSession, None]:
     """
     Асинхронный генератор, предоставляющий сессию БД для каждого запроса.
     Сессия автоматически закрывается после использования.
+
+    Для маршрутов с параметром wallet_id сессия открывается на шарде,
+    где хранится этот кошелек.
     """
-    async with AsyncSessionLocal() as session:
+    wallet_id = request.path_params.get("wallet_id")
+    async with shard_router.sessionmaker_for(wallet_id)() as session:
         yield session
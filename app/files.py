@@ -0,0 +1,16 @@
+import os
+from pathlib import Path
+
+
+def fsync_directory(path: Path) -> None:
+    """
+    Синхронизировать каталог с диском.
+
+    Создание, переименование и удаление файлов становятся надежными
+    только после fsync каталога.
+    """
+    fd = os.open(path, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
@@ -0,0 +1,176 @@
+import heapq
+import time
+from collections import deque
+from typing import Callable, Deque, Dict, List, Tuple
+
+from app.config import settings
+
+
+class SpaceSaving:
+    """
+    Взвешенный алгоритм Space-Saving для поиска самых частых ключей.
+
+    Хранит не более capacity счетчиков, поэтому память не зависит от
+    количества кошельков. Ключ, вытеснивший минимальный счетчик,
+    наследует его значение как погрешность: оценка счетчика никогда не
+    занижена и завышена не более чем на error.
+
+    Минимальный счетчик ищется по куче с ленивым удалением: после
+    каждого изменения в нее добавляется новая пара (счетчик, ключ),
+    а устаревшие пары пропускаются при извлечении. Куча периодически
+    перестраивается, поэтому add стоит O(log capacity) амортизированно.
+    """
+
+    def __init__(self, capacity: int):
+        self.capacity = capacity
+        self.counts: Dict[str, float] = {}
+        self.errors: Dict[str, float] = {}
+        self._heap: List[Tuple[float, str]] = []
+
+    def add(self, key: str, weight: float = 1.0) -> None:
+        """Увеличить счетчик ключа на weight."""
+        if key in self.counts:
+            self.counts[key] += weight
+        elif len(self.counts) < self.capacity:
+            self.counts[key] = weight
+            self.errors[key] = 0.0
+        else:
+            min_key, min_count = self._pop_min()
+            del self.counts[min_key]
+            del self.errors[min_key]
+            self.counts[key] = min_count + weight
+            self.errors[key] = min_count
+
+        heapq.heappush(self._heap, (self.counts[key], key))
+        if len(self._heap) > 4 * self.capacity:
+            self._heap = [(count, k) for k, count in self.counts.items()]
+            heapq.heapify(self._heap)
+
+    def _pop_min(self) -> Tuple[str, float]:
+        while True:
+            count, key = heapq.heappop(self._heap)
+            if self.counts.get(key) == count:
+                return key, count
+
+    def floor(self) -> float:
+        """
+        Верхняя граница счетчика ключа, отсутствующего в скетче.
+
+        Пока скетч не заполнен, отсутствующий ключ не встречался вовсе;
+        после заполнения он мог быть вытеснен с любым счетчиком, не
+        большим минимального.
+        """
+        if len(self.counts) < self.capacity:
+            return 0.0
+        return min(self.counts.values())
+
+    def top(self, k: int) -> List[Tuple[str, float, float]]:
+        """
+        Вернуть k ключей с наибольшими счетчиками.
+
+        :return: Список кортежей (ключ, оценка счетчика, погрешность)
+        """
+        keys = sorted(self.counts, key=self.counts.__getitem__, reverse=True)
+        return [(key, self.counts[key], self.errors[key]) for key in keys[:k]]
+
+
+class _Window:
+    """Окно времени со своими счетчиками операций и ожидания блокировок."""
+
+    def __init__(self, start: float, capacity: int):
+        self.start = start
+        self.operations = SpaceSaving(capacity)
+        self.lock_wait = SpaceSaving(capacity)
+
+
+class HotWalletProfiler:
+    """
+    Профилировщик «горячих» кошельков по скользящим окнам.
+
+    Время разбито на windows окон по window_seconds секунд; при запросе
+    статистики счетчики последних окон суммируются. Старые окна
+    отбрасываются целиком, поэтому память ограничена
+    windows * capacity счетчиками.
+    """
+
+    def __init__(
+        self,
+        capacity: int,
+        window_seconds: float,
+        windows: int,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.capacity = capacity
+        self.window_seconds = window_seconds
+        self.clock = clock
+        self._windows: Deque[_Window] = deque(maxlen=windows)
+
+    def _current_window(self) -> _Window:
+        now = self.clock()
+        if (
+            not self._windows
+            or now - self._windows[-1].start >= self.window_seconds
+        ):
+            self._windows.append(_Window(now, self.capacity))
+        return self._windows[-1]
+
+    def record_operation(self, wallet_id: str, lock_wait: float) -> None:
+        """
+        Учесть операцию с кошельком.
+
+        :param wallet_id: UUID кошелька
+        :param lock_wait: Время ожидания блокировки строки в секундах
+        """
+        window = self._current_window()
+        window.operations.add(wallet_id)
+        if lock_wait > 0:
+            window.lock_wait.add(wallet_id, lock_wait)
+
+    def _active_windows(self) -> List[_Window]:
+        horizon = self.clock() - self.window_seconds * self._windows.maxlen
+        return [w for w in self._windows if w.start > horizon]
+
+    def covered_seconds(self) -> float:
+        """Длительность интервала, за который собрана статистика."""
+        windows = self._active_windows()
+        if not windows:
+            return 0.0
+        return max(self.clock() - windows[0].start, self.window_seconds)
+
+    def top_by_operations(self, k: int) -> List[Tuple[str, float, float]]:
+        """Кошельки с наибольшим числом операций за скользящий интервал."""
+        return self._merge([w.operations for w in self._active_windows()], k)
+
+    def top_by_lock_wait(self, k: int) -> List[Tuple[str, float, float]]:
+        """Кошельки с наибольшим суммарным ожиданием блокировок (в сек.)."""
+        return self._merge([w.lock_wait for w in self._active_windows()], k)
+
+    @staticmethod
+    def _merge(
+        sketches: List[SpaceSaving], k: int
+    ) -> List[Tuple[str, float, float]]:
+        # Ключу, отсутствующему в заполненном окне, добавляется минимальный
+        # счетчик окна и в оценку, и в погрешность: иначе сумма могла бы
+        # оказаться меньше истинного значения.
+        counts: Dict[str, float] = {}
+        for sketch in sketches:
+            counts.update(dict.fromkeys(sketch.counts, 0.0))
+        errors = dict.fromkeys(counts, 0.0)
+        for sketch in sketches:
+            floor = sketch.floor()
+            for key in counts:
+                if key in sketch.counts:
+                    counts[key] += sketch.counts[key]
+                    errors[key] += sketch.errors[key]
+                elif floor:
+                    counts[key] += floor
+                    errors[key] += floor
+        keys = sorted(counts, key=counts.__getitem__, reverse=True)
+        return [(key, counts[key], errors[key]) for key in keys[:k]]
+
+
+profiler = HotWalletProfiler(
+    capacity=settings.HOT_WALLETS_CAPACITY,
+    window_seconds=settings.HOT_WALLETS_WINDOW_SECONDS,
+    windows=settings.HOT_WALLETS_WINDOWS,
+)
@@ -1,17 +1,40 @@
-from contextlib import asynccontextmanager
+import asyncio
+import json
+import logging
+from contextlib import AsyncExitStack, asynccontextmanager
+from datetime import datetime, timezone
+from typing import List, Literal, Optional
 
-from fastapi import Depends, FastAPI, HTTPException
+from fastapi import Depends, FastAPI, Header, HTTPException, Query, Response
+from fastapi.responses import PlainTextResponse, StreamingResponse
 from sqlalchemy import text
 from sqlalchemy.ext.asyncio import AsyncSession
 
+from app.archive import read_archived_operations
+from app.balance_stream import broadcaster
 from app.config import settings
-from app.database import engine, get_db
+from app.database import get_db, shard_router
+from app.hot_wallets import profiler
+from app.memory_store import memory_store
+from app.pagination import decode_cursor, encode_cursor
+from app.repositories.base import BaseWalletRepository
+from app.repositories.memory_repository import MemoryWalletRepository
 from app.repositories.wallet_repository import WalletRepository
 from app.schemas import (
+    HotWallet,
+    HotWalletsResponse,
+    OperationItem,
     OperationResponse,
+    OperationsPage,
+    OperationType,
+    StatsBucket,
+    StatsResponse,
     WalletOperationRequest,
     WalletResponse,
 )
+from app.stats import BUCKET_SIZES, aggregator, bucket_count, read_rollups
+
+logger = logging.getLogger(__name__)
 
 
 @asynccontextmanager
@@ -20,10 +43,31 @@ async def lifespan(app: FastAPI):
     Контекстный менеджер lifespan управляет событиями запуска и остановки.
     """
     print("Starting up...")
+    if settings.STORAGE_BACKEND == "memory":
+        replayed = await memory_store.open()
+        print(
+            f"Memory storage recovered: {len(memory_store)} wallets, "
+            f"{replayed} log records replayed"
+        )
+        yield
+        print("Shutting down...")
+        await memory_store.close()
+        return
+
     # Таблицы создаются через миграции Alembic
+    try:
+        await broadcaster.start()
+    except Exception as e:
+        # Без LISTEN приложение работает, но условные GET идут в БД,
+        # а поток изменений баланса подключится при первой подписке.
+        print(f"Balance notifications are unavailable: {e}")
+    if settings.STATS_AGGREGATION_INTERVAL_SECONDS > 0:
+        aggregator.start()
     yield
     print("Shutting down...")
-    await engine.dispose()
+    await aggregator.stop()
+    await broadcaster.stop()
+    await shard_router.dispose()
 
 
 app = FastAPI(
@@ -34,9 +78,46 @@ app = FastAPI(
 )
 
 
+async def get_repository(
+    db: AsyncSession = Depends(get_db),
+) -> BaseWalletRepository:
+    """Репозиторий кошельков выбранного хранилища (STORAGE_BACKEND)."""
+    if settings.STORAGE_BACKEND == "memory":
+        return MemoryWalletRepository(memory_store)
+    return WalletRepository(db)
+
+
+async def _shard_sessions(
+    stack: AsyncExitStack, db: AsyncSession, db_shard: str
+) -> List[AsyncSession]:
+    # Сессия шарда db_shard уже открыта get_db, остальные открываются
+    # в stack и закрываются вместе с ним.
+    sessions = [db]
+    for shard, sessionmaker in shard_router.sessionmakers.items():
+        if shard != db_shard:
+            sessions.append(await stack.enter_async_context(sessionmaker()))
+    return sessions
+
+
+def _require_postgres(feature: str) -> None:
+    if settings.STORAGE_BACKEND != "postgres":
+        raise HTTPException(
+            status_code=501,
+            detail=f"{feature} is not available with the "
+            f"{settings.STORAGE_BACKEND} storage backend",
+        )
+
+
 @app.get("/health")
 async def health_check(db: AsyncSession = Depends(get_db)):
     """Проверяет, что приложение работает и может подключиться к БД."""
+    if settings.STORAGE_BACKEND == "memory":
+        if memory_store.is_open:
+            return {"status": "healthy", "storage": "memory"}
+        result = {"status": "unhealthy", "storage": "memory"}
+        if memory_store.error is not None:
+            result["error"] = str(memory_store.error)
+        return result
     try:
         await db.execute(text("SELECT 1"))
         return {"status": "healthy", "database": "connected"}
@@ -46,15 +127,50 @@ async def health_check(db: AsyncSession = Depends(get_db)):
         }
 
 
+def _etag(version: int) -> str:
+    return f'"{version}"'
+
+
+def _etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    if not if_none_match:
+        return False
+    tags = [tag.strip() for tag in if_none_match.split(",")]
+    # Слабое сравнение (RFC 9110): префикс W/ не учитывается
+    return "*" in tags or etag in [tag.removeprefix("W/") for tag in tags]
+
+
 @app.get(
     "/api/v1/wallets/{wallet_id}",
     response_model=WalletResponse,
     summary="Получить баланс кошелька",
-    description="Возвращает текущий баланс указанного кошелька.",
+    description="""
+    Возвращает текущий баланс указанного кошелька.
+
+    Ответ содержит заголовок ETag с версией кошелька. Если передать его
+    в If-None-Match и баланс не изменился, вернется 304 Not Modified.
+    """,
+    responses={304: {"description": "Баланс не изменился"}},
 )
-async def get_balance(wallet_id: str, db: AsyncSession = Depends(get_db)):
+async def get_balance(
+    wallet_id: str,
+    response: Response,
+    if_none_match: Optional[str] = Header(None),
+    repo: BaseWalletRepository = Depends(get_repository),
+):
     """Получение баланса кошелька."""
-    repo = WalletRepository(db)
+    versions = broadcaster.versions
+    listening = broadcaster.is_listening
+
+    # Пока процесс получает уведомления обо всех коммитах, известная
+    # версия актуальна и на условный запрос можно ответить без БД.
+    if if_none_match and listening:
+        version = versions.get(wallet_id)
+        if version is not None and _etag_matches(
+            if_none_match, _etag(version)
+        ):
+            return Response(status_code=304, headers={"ETag": _etag(version)})
+
+    generation = versions.generation
     wallet = await repo.get_wallet(wallet_id)
 
     if not wallet:
@@ -62,9 +178,91 @@ async def get_balance(wallet_id: str, db: AsyncSession = Depends(get_db)):
             status_code=404, detail=f"Wallet with id {wallet_id} not found"
         )
 
+    if listening:
+        versions.update(wallet.id, wallet.version, generation)
+
+    etag = _etag(wallet.version)
+    if _etag_matches(if_none_match, etag):
+        return Response(status_code=304, headers={"ETag": etag})
+
+    response.headers["ETag"] = etag
+    response.headers["Cache-Control"] = "no-cache"
     return WalletResponse(wallet_id=wallet.id, balance=float(wallet.balance))
 
 
+def _sse_event(wallet_id: str, balance) -> str:
+    data = json.dumps({"wallet_id": wallet_id, "balance": float(balance)})
+    return f"event: balance\ndata: {data}\n\n"
+
+
+@app.get(
+    "/api/v1/wallets/{wallet_id}/stream",
+    response_class=StreamingResponse,
+    summary="Поток изменений баланса",
+    description="""
+    Server-Sent Events: первым событием приходит текущий баланс,
+    затем - новый баланс после каждой успешной операции с кошельком.
+    """,
+)
+async def stream_balance(wallet_id: str, db: AsyncSession = Depends(get_db)):
+    """Подписка на изменения баланса кошелька."""
+    _require_postgres("Balance stream")
+    repo = WalletRepository(db)
+    try:
+        # Канал и кошелек проверяются до ответа: после отправки
+        # заголовков вернуть 503 или 404 уже нельзя.
+        await broadcaster.start()
+        wallet = await repo.get_wallet(wallet_id)
+        await db.close()
+    except Exception:
+        logger.exception("Balance stream for wallet %s failed", wallet_id)
+        raise HTTPException(
+            status_code=503, detail="Balance stream is unavailable"
+        )
+
+    if not wallet:
+        raise HTTPException(
+            status_code=404, detail=f"Wallet with id {wallet_id} not found"
+        )
+
+    async def events():
+        # Подписка создается в теле ответа: если клиент отключится до
+        # начала передачи, генератор не запустится и подписки не будет.
+        async with broadcaster.subscribe(wallet_id) as queue:
+            # Баланс перечитывается после подписки, чтобы не пропустить
+            # изменения между проверкой и подпиской.
+            try:
+                current = await repo.get_wallet(wallet_id) or wallet
+            finally:
+                # Поток может жить часами - не держим соединение из пула.
+                await db.close()
+            yield _sse_event(current.id, current.balance)
+            last_version = current.version
+            while True:
+                try:
+                    event = await asyncio.wait_for(
+                        queue.get(),
+                        timeout=settings.BALANCE_STREAM_KEEPALIVE_SECONDS,
+                    )
+                except asyncio.TimeoutError:
+                    yield ": keepalive\n\n"
+                    continue
+                if event is None:
+                    return
+                # Уведомление могло прийти позже, чем было прочитано
+                # начальное состояние, - устаревшие версии пропускаем.
+                if event["version"] <= last_version:
+                    continue
+                last_version = event["version"]
+                yield _sse_event(event["wallet_id"], event["balance"])
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
 @app.post(
     "/api/v1/wallets/{wallet_id}/operation",
     response_model=OperationResponse,
@@ -82,17 +280,22 @@ async def get_balance(wallet_id: str, db: AsyncSession = Depends(get_db)):
 async def perform_operation(
     wallet_id: str,
     operation: WalletOperationRequest,
-    db: AsyncSession = Depends(get_db),
+    repo: BaseWalletRepository = Depends(get_repository),
 ):
     """Изменение баланса кошелька."""
+    versions = broadcaster.versions
+    generation = versions.generation
     try:
-        repo = WalletRepository(db)
-
         wallet = await repo.update_balance(
             wallet_id=wallet_id,
             operation_type=operation.operation_type.value,
             amount=operation.amount,
         )
+        # Уведомление о коммите приходит позже ответа: без этого
+        # условный GET в этом процессе успел бы вернуть 304 по прежней
+        # версии.
+        if broadcaster.is_listening:
+            versions.update(wallet.id, wallet.version, generation)
 
         return OperationResponse(
             wallet_id=wallet.id,
@@ -111,12 +314,240 @@ async def perform_operation(
             raise HTTPException(
                 status_code=404, detail=f"Wallet with id {wallet_id} not found"
             )
+        elif "Concurrent update conflict" in error_msg:
+            raise HTTPException(
+                status_code=409,
+                detail="Wallet is being updated concurrently, retry later",
+            )
         else:
             raise HTTPException(status_code=400, detail=error_msg)
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 
+@app.get(
+    "/api/v1/wallets/{wallet_id}/operations",
+    response_model=OperationsPage,
+    summary="История операций кошелька",
+    description="""
+    Возвращает операции кошелька от новых к старым.
+
+    Пагинация курсорная: для получения следующей страницы передайте
+    значение next_cursor из предыдущего ответа в параметре cursor.
+
+    Операции старше срока хранения переносятся в архив. С archived=true
+    история продолжается архивными операциями (медленнее: читаются
+    файлы архива).
+    """,
+)
+async def list_operations(
+    wallet_id: str,
+    limit: int = Query(50, ge=1, le=500),
+    cursor: Optional[str] = None,
+    operation_type: Optional[OperationType] = None,
+    created_from: Optional[datetime] = None,
+    created_to: Optional[datetime] = None,
+    archived: bool = False,
+    db: AsyncSession = Depends(get_db),
+):
+    """Получение истории операций кошелька."""
+    _require_postgres("Operation history")
+    repo = WalletRepository(db)
+    try:
+        after = decode_cursor(cursor) if cursor else None
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+    filters = dict(
+        wallet_id=wallet_id,
+        limit=limit + 1,
+        after=after,
+        operation_type=operation_type.value if operation_type else None,
+        created_from=created_from,
+        created_to=created_to,
+    )
+    operations = await repo.list_operations(**filters)
+
+    if archived:
+        # Обычно архивные операции старше оставшихся в БД, но это не
+        # гарантировано, поэтому страница собирается слиянием по ключу.
+        # Архив читается после БД: перенос, зафиксированный между
+        # чтениями, может только продублировать операцию (она останется
+        # в прочитанных строках и появится в сегменте), но не скрыть ее.
+        # Повторы убираются по ключу страницы (created_at, id).
+        async with AsyncExitStack() as stack:
+            sessions = await _shard_sessions(
+                stack, db, shard_router.shard_for(wallet_id)
+            )
+            archived_operations = await read_archived_operations(
+                sessions, **filters
+            )
+        merged = {
+            (op.created_at, op.id): op
+            for op in [*archived_operations, *operations]
+        }
+        operations = sorted(
+            merged.values(),
+            key=lambda op: (op.created_at, op.id),
+            reverse=True,
+        )
+        operations = operations[:limit + 1]
+
+    if not operations and after is None:
+        if not await repo.get_wallet(wallet_id):
+            raise HTTPException(
+                status_code=404, detail=f"Wallet with id {wallet_id} not found"
+            )
+
+    next_cursor = None
+    if len(operations) > limit:
+        operations = operations[:limit]
+        last = operations[-1]
+        next_cursor = encode_cursor(last.created_at, last.id)
+
+    return OperationsPage(
+        wallet_id=wallet_id,
+        items=[OperationItem.model_validate(op) for op in operations],
+        next_cursor=next_cursor,
+    )
+
+
+def _hot_wallets(limit: int) -> HotWalletsResponse:
+    window = profiler.covered_seconds() or 1.0
+    return HotWalletsResponse(
+        window_seconds=window,
+        by_operations=[
+            HotWallet(wallet_id=key, value=count / window, error=err / window)
+            for key, count, err in profiler.top_by_operations(limit)
+        ],
+        by_lock_wait_ms=[
+            HotWallet(wallet_id=key, value=total * 1000, error=err * 1000)
+            for key, total, err in profiler.top_by_lock_wait(limit)
+        ],
+    )
+
+
+@app.get(
+    "/api/v1/admin/hot-wallets",
+    response_model=HotWalletsResponse,
+    summary="Самые нагруженные кошельки",
+    description="""
+    Возвращает кошельки с наибольшей частотой операций (операций в секунду)
+    и наибольшим суммарным ожиданием блокировок (мс) за скользящий интервал.
+
+    Значения приблизительные: error - верхняя граница завышения оценки.
+    """,
+)
+async def get_hot_wallets(limit: int = Query(10, ge=1, le=1000)):
+    """Статистика «горячих» кошельков."""
+    return _hot_wallets(limit)
+
+
+# Максимальное количество интервалов в одном ответе /stats
+MAX_STATS_BUCKETS = 1000
+
+
+def _utc(value: datetime) -> datetime:
+    # Время без часового пояса считается UTC
+    if value.tzinfo is None:
+        return value.replace(tzinfo=timezone.utc)
+    return value
+
+
+@app.get(
+    "/api/v1/stats",
+    response_model=StatsResponse,
+    summary="Статистика операций",
+    description="""
+    Возвращает по часам или суткам (UTC) количество и суммы пополнений
+    и списаний, чистый приток и число кошельков с операциями.
+
+    Агрегаты обновляются фоновой задачей, поэтому последние секунды
+    операций могут еще не попасть в ответ. По умолчанию возвращаются
+    последние 24 часа (hour) или 30 суток (day); интервалы без операций
+    не выводятся.
+    """,
+)
+async def get_stats(
+    granularity: Literal["hour", "day"] = "hour",
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    db: AsyncSession = Depends(get_db),
+):
+    """Получение агрегированной статистики операций."""
+    _require_postgres("Statistics")
+    size = BUCKET_SIZES[granularity]
+    if end is None:
+        now = datetime.now(timezone.utc)
+        epoch = datetime(1970, 1, 1, tzinfo=timezone.utc)
+        end = now - (now - epoch) % size + size
+    end = _utc(end)
+    if start is None:
+        start = end - size * (24 if granularity == "hour" else 30)
+    start = _utc(start)
+
+    if start >= end:
+        raise HTTPException(status_code=400, detail="start must be before end")
+    if bucket_count(granularity, start, end) > MAX_STATS_BUCKETS:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Range exceeds {MAX_STATS_BUCKETS} {granularity} buckets",
+        )
+
+    async with AsyncExitStack() as stack:
+        sessions = await _shard_sessions(
+            stack, db, shard_router.default_shard
+        )
+        rows = await read_rollups(sessions, granularity, start, end)
+
+    return StatsResponse(
+        granularity=granularity,
+        start=start,
+        end=end,
+        buckets=[
+            StatsBucket(
+                **row,
+                net_flow=row["deposits_amount"] - row["withdrawals_amount"],
+            )
+            for row in rows
+        ],
+    )
+
+
+def _metric_label(value: str) -> str:
+    return (
+        value.replace("\\", "\\\\").replace('"', '\\"')
+        .replace("\n", "\\n")
+    )
+
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def metrics():
+    """Метрики «горячих» кошельков в текстовом формате Prometheus."""
+    stats = _hot_wallets(settings.HOT_WALLETS_CAPACITY)
+    lines = [
+        "# HELP wallet_hot_operations_per_second "
+        "Operation rate of the busiest wallets.",
+        "# TYPE wallet_hot_operations_per_second gauge",
+    ]
+    lines += [
+        f'wallet_hot_operations_per_second{{wallet_id="'
+        f'{_metric_label(item.wallet_id)}"}} {item.value}'
+        for item in stats.by_operations
+    ]
+    lines += [
+        "# HELP wallet_hot_lock_wait_milliseconds "
+        "Total row lock wait of the most contended wallets.",
+        "# TYPE wallet_hot_lock_wait_milliseconds gauge",
+    ]
+    lines += [
+        f'wallet_hot_lock_wait_milliseconds{{wallet_id="'
+        f'{_metric_label(item.wallet_id)}"}} {item.value}'
+        for item in stats.by_lock_wait_ms
+    ]
+    return "\n".join(lines) + "\n"
+
+
 @app.get("/")
 async def root():
     """Корневой эндпоинт."""
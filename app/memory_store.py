@@ -0,0 +1,420 @@
+import asyncio
+import json
+import os
+import zlib
+from decimal import Decimal
+from pathlib import Path
+from typing import (
+    BinaryIO,
+    Callable,
+    Dict,
+    List,
+    NamedTuple,
+    Optional,
+    Tuple,
+)
+
+from app.config import settings
+from app.files import fsync_directory
+
+SNAPSHOT_FILE = "snapshot.json"
+SEGMENT_PREFIX = "wal-"
+SEGMENT_SUFFIX = ".log"
+
+
+class MemoryWallet(NamedTuple):
+    """Состояние кошелька в памяти на момент чтения."""
+
+    id: str
+    balance: Decimal
+    version: int
+
+
+def _encode(lsn: int, payload: dict) -> bytes:
+    # Строка журнала: CRC32 тела и JSON. Недописанная при сбое строка
+    # не проходит проверку и отбрасывается при восстановлении.
+    body = json.dumps(
+        {"lsn": lsn, **payload}, separators=(",", ":")
+    ).encode()
+    return b"%08x %s\n" % (zlib.crc32(body), body)
+
+
+def _decode(line: bytes) -> Optional[dict]:
+    if not line.endswith(b"\n") or len(line) < 10 or line[8:9] != b" ":
+        return None
+    body = line[9:-1]
+    try:
+        if int(line[:8], 16) != zlib.crc32(body):
+            return None
+        record: dict = json.loads(body)
+        return record
+    except ValueError:
+        return None
+
+
+class WriteAheadLog:
+    """
+    Журнал упреждающей записи из последовательности сегментов.
+
+    Записи добавляются в конец текущего сегмента фоновой задачей:
+    все записи, накопившиеся, пока выполнялся предыдущий fsync, пишутся
+    и синхронизируются одним вызовом (групповой коммит). append
+    возвращает управление только после того, как запись надежно
+    сохранена и передана в on_durable.
+    """
+
+    def __init__(
+        self,
+        directory: Path,
+        on_durable: Callable[[int, dict], None],
+        fsync: bool = True,
+    ):
+        self.directory = directory
+        self.on_durable = on_durable
+        self.fsync = fsync
+        self.last_lsn = 0
+        self._pending: List[Tuple[bytes, int, dict, asyncio.Future]] = []
+        self._wakeup = asyncio.Event()
+        self._rotations: List[asyncio.Future] = []
+        self._file: Optional[BinaryIO] = None
+        self._task: Optional[asyncio.Task] = None
+        self._closing = False
+        self._failed: Optional[BaseException] = None
+
+    @property
+    def error(self) -> Optional[BaseException]:
+        """Ошибка записи, после которой журнал перестал принимать записи."""
+        return self._failed
+
+    def segments(self) -> List[Path]:
+        """Сегменты журнала в порядке записи."""
+        return sorted(self.directory.glob(f"{SEGMENT_PREFIX}*{SEGMENT_SUFFIX}"))
+
+    def replay(self, after_lsn: int) -> int:
+        """
+        Передать в on_durable все записи журнала новее after_lsn.
+
+        Сегмент читается до первой поврежденной строки; хвост, не
+        дописанный при сбое, обрезается. Такие записи не были
+        подтверждены клиентам.
+
+        :return: Количество примененных записей
+        """
+        replayed = 0
+        for path in self.segments():
+            valid = 0
+            with open(path, "rb") as stream:
+                for line in stream:
+                    record = _decode(line)
+                    if record is None:
+                        break
+                    valid += len(line)
+                    lsn = record.pop("lsn")
+                    self.last_lsn = max(self.last_lsn, lsn)
+                    if lsn > after_lsn:
+                        self.on_durable(lsn, record)
+                        replayed += 1
+            if valid < path.stat().st_size:
+                os.truncate(path, valid)
+        self.last_lsn = max(self.last_lsn, after_lsn)
+        return replayed
+
+    def start(self) -> None:
+        """Открыть новый сегмент и запустить фоновую запись."""
+        self._open_segment(self._next_segment())
+        self._task = asyncio.create_task(self._run())
+
+    async def close(self) -> None:
+        """Дописать накопленные записи и закрыть журнал."""
+        if self._task is not None:
+            self._closing = True
+            self._wakeup.set()
+            await self._task
+            self._task = None
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    async def append(self, payload: dict) -> int:
+        """
+        Добавить запись и дождаться ее сохранения.
+
+        :return: Номер записи (LSN)
+        :raises RuntimeError: Если журнал закрыт или запись на диск
+        завершилась ошибкой
+        """
+        if self._failed is not None or self._closing or self._task is None:
+            raise RuntimeError("Write-ahead log is unavailable")
+        self.last_lsn += 1
+        future: "asyncio.Future[int]" = (
+            asyncio.get_running_loop().create_future()
+        )
+        self._pending.append(
+            (_encode(self.last_lsn, payload), self.last_lsn, payload, future)
+        )
+        self._wakeup.set()
+        return await future
+
+    async def rotate(self) -> List[Path]:
+        """
+        Начать новый сегмент между пачками записей.
+
+        :return: Закрытые сегменты: все их записи уже переданы
+        в on_durable
+        :raises RuntimeError: Если журнал закрыт или запись на диск
+        завершилась ошибкой
+        """
+        if self._failed is not None or self._task is None:
+            raise RuntimeError("Write-ahead log is unavailable")
+        future: "asyncio.Future[List[Path]]" = (
+            asyncio.get_running_loop().create_future()
+        )
+        self._rotations.append(future)
+        self._wakeup.set()
+        return await future
+
+    def _next_segment(self) -> Path:
+        # Имя считается в цикле событий: append() меняет last_lsn
+        return self.directory / (
+            f"{SEGMENT_PREFIX}{self.last_lsn + 1:020d}{SEGMENT_SUFFIX}"
+        )
+
+    def _open_segment(self, path: Path) -> None:
+        if self._file is not None:
+            self._file.close()
+        self._file = open(path, "ab")
+        fsync_directory(self.directory)
+
+    def _write(self, data: bytes) -> None:
+        assert self._file is not None
+        self._file.write(data)
+        self._file.flush()
+        if self.fsync:
+            os.fsync(self._file.fileno())
+
+    async def _run(self) -> None:
+        while True:
+            await self._wakeup.wait()
+            self._wakeup.clear()
+
+            batch, self._pending = self._pending, []
+            if batch:
+                try:
+                    await asyncio.to_thread(
+                        self._write, b"".join(item[0] for item in batch)
+                    )
+                except Exception as e:
+                    # Состояние файла неизвестно: дальнейшие записи могут
+                    # оказаться после поврежденной строки и потеряться
+                    # при восстановлении, поэтому журнал больше не пишет.
+                    self._fail(e, batch)
+                    return
+                for _, lsn, payload, future in batch:
+                    self.on_durable(lsn, payload)
+                    if not future.done():
+                        future.set_result(lsn)
+                # Пока шла запись, могли накопиться новые записи
+                if self._pending:
+                    self._wakeup.set()
+                    continue
+
+            if self._rotations:
+                assert self._file is not None
+                current = Path(self._file.name)
+                closed = [path for path in self.segments() if path != current]
+                # Пустой сегмент продолжает использоваться: новый получил
+                # бы то же имя.
+                if self._file.tell() > 0:
+                    try:
+                        await asyncio.to_thread(
+                            self._open_segment, self._next_segment()
+                        )
+                    except Exception as e:
+                        self._fail(e, [])
+                        return
+                    closed.append(current)
+                rotations, self._rotations = self._rotations, []
+                for rotation in rotations:
+                    rotation.set_result(closed)
+
+            if self._closing and not self._pending:
+                return
+
+    def _fail(
+        self,
+        error: BaseException,
+        batch: List[Tuple[bytes, int, dict, asyncio.Future]],
+    ) -> None:
+        self._failed = error
+        for *_, future in batch + self._pending:
+            if not future.done():
+                future.set_exception(
+                    RuntimeError("Write-ahead log is unavailable")
+                )
+        self._pending = []
+        rotations, self._rotations = self._rotations, []
+        for rotation in rotations:
+            rotation.set_exception(
+                RuntimeError("Write-ahead log is unavailable")
+            )
+
+
+class MemoryWalletStore:
+    """
+    Хранилище балансов в памяти процесса с журналом на диске.
+
+    Баланс хранится в копейках (int) вместе с версией - около сотни
+    байт на кошелек. Изменения одного кошелька упорядочены блокировкой
+    его полосы (lock striping: кошельки распределены по фиксированному
+    числу блокировок), изменения разных кошельков выполняются
+    параллельно и сохраняются общим fsync.
+
+    Изменение применяется к памяти только после записи в журнал,
+    поэтому читатели не видят неподтвержденных балансов. Каждые
+    snapshot_every записей состояние сохраняется в снимок, а сегменты
+    журнала, полностью вошедшие в снимок, удаляются. При открытии
+    состояние восстанавливается из снимка и оставшихся сегментов.
+    """
+
+    def __init__(
+        self,
+        directory: str,
+        fsync: bool = True,
+        snapshot_every: int = 100_000,
+        lock_stripes: int = 1024,
+    ):
+        self.directory = Path(directory)
+        self.snapshot_every = snapshot_every
+        self._wallets: Dict[str, Tuple[int, int]] = {}
+        self._locks = [asyncio.Lock() for _ in range(lock_stripes)]
+        self._wal = WriteAheadLog(self.directory, self._apply, fsync)
+        self._applied_lsn = 0
+        self._snapshot_lsn = 0
+        self._snapshot_task: Optional[asyncio.Task] = None
+        self._snapshot_lock = asyncio.Lock()
+        self._opened = False
+
+    @property
+    def is_open(self) -> bool:
+        """Открыто ли хранилище и принимает ли журнал записи."""
+        return self._opened and self._wal.error is None
+
+    @property
+    def error(self) -> Optional[BaseException]:
+        """Ошибка записи журнала, если она произошла."""
+        return self._wal.error
+
+    def __len__(self) -> int:
+        return len(self._wallets)
+
+    async def open(self) -> int:
+        """
+        Восстановить состояние с диска и начать прием изменений.
+
+        :return: Количество примененных записей журнала
+        """
+        if self._opened:
+            return 0
+        self.directory.mkdir(parents=True, exist_ok=True)
+        replayed = await asyncio.to_thread(self._recover)
+        self._wal.start()
+        self._opened = True
+        return replayed
+
+    async def close(self) -> None:
+        """
+        Дописать журнал, сохранить снимок и закрыть хранилище.
+
+        После ошибки записи журнала снимок не сохраняется: состояние
+        восстанавливается из прежнего снимка и журнала при открытии.
+        """
+        if not self._opened:
+            return
+        if self._wal.error is None:
+            await self.snapshot()
+        await self._wal.close()
+        self._opened = False
+
+    def get(self, wallet_id: str) -> Optional[MemoryWallet]:
+        """Текущее состояние кошелька или None."""
+        state = self._wallets.get(wallet_id)
+        if state is None:
+            return None
+        return MemoryWallet(wallet_id, Decimal(state[0]).scaleb(-2), state[1])
+
+    def lock(self, wallet_id: str) -> asyncio.Lock:
+        """Блокировка полосы, к которой относится кошелек."""
+        return self._locks[hash(wallet_id) % len(self._locks)]
+
+    async def put(
+        self, wallet_id: str, balance: Decimal, version: int
+    ) -> MemoryWallet:
+        """
+        Сохранить новое состояние кошелька.
+
+        Вызывается под блокировкой полосы кошелька; возвращает
+        управление после записи в журнал.
+        """
+        cents = int(balance.scaleb(2))
+        await self._wal.append({"w": wallet_id, "c": cents, "v": version})
+        if (
+            self._applied_lsn - self._snapshot_lsn >= self.snapshot_every
+            and self._snapshot_task is None
+        ):
+            self._snapshot_task = asyncio.create_task(self.snapshot())
+        return MemoryWallet(wallet_id, balance, version)
+
+    async def snapshot(self) -> None:
+        """Сохранить снимок состояния и удалить покрытые им сегменты."""
+        try:
+            async with self._snapshot_lock:
+                closed = await self._wal.rotate()
+                # Копия берется синхронно: она точно соответствует записям
+                # до _applied_lsn, включая все записи закрытых сегментов.
+                lsn, wallets = self._applied_lsn, dict(self._wallets)
+                await asyncio.to_thread(self._write_snapshot, lsn, wallets)
+                self._snapshot_lsn = lsn
+                for path in closed:
+                    path.unlink(missing_ok=True)
+                await asyncio.to_thread(fsync_directory, self.directory)
+        finally:
+            if self._snapshot_task is asyncio.current_task():
+                self._snapshot_task = None
+
+    def _apply(self, lsn: int, record: dict) -> None:
+        self._wallets[record["w"]] = (record["c"], record["v"])
+        self._applied_lsn = lsn
+
+    def _recover(self) -> int:
+        path = self.directory / SNAPSHOT_FILE
+        if path.exists():
+            with open(path, "rb") as stream:
+                data = json.load(stream)
+            self._wallets = {
+                wallet_id: tuple(state)
+                for wallet_id, state in data["wallets"].items()
+            }
+            self._snapshot_lsn = self._applied_lsn = data["lsn"]
+        return self._wal.replay(after_lsn=self._snapshot_lsn)
+
+    def _write_snapshot(
+        self, lsn: int, wallets: Dict[str, Tuple[int, int]]
+    ) -> None:
+        # Снимок пишется во временный файл и атомарно подменяет прежний
+        temporary = self.directory / (SNAPSHOT_FILE + ".tmp")
+        with open(temporary, "w", encoding="utf-8") as stream:
+            json.dump(
+                {"lsn": lsn, "wallets": wallets}, stream, separators=(",", ":")
+            )
+            stream.flush()
+            os.fsync(stream.fileno())
+        os.replace(temporary, self.directory / SNAPSHOT_FILE)
+        fsync_directory(self.directory)
+
+
+memory_store = MemoryWalletStore(
+    directory=settings.MEMORY_DATA_DIR,
+    fsync=settings.MEMORY_WAL_FSYNC,
+    snapshot_every=settings.MEMORY_SNAPSHOT_EVERY,
+    lock_stripes=settings.MEMORY_LOCK_STRIPES,
+)
@@ -1,6 +1,19 @@
 import uuid
+from datetime import datetime, timezone
 
-from sqlalchemy import Column, Numeric, String
+from sqlalchemy import (
+    BigInteger,
+    Column,
+    DateTime,
+    ForeignKey,
+    Index,
+    Integer,
+    Numeric,
+    PrimaryKeyConstraint,
+    String,
+    func,
+)
+from sqlalchemy.dialects.postgresql import JSONB
 
 from app.database import Base
 
@@ -19,6 +32,176 @@ class Wallet(Base):
     balance = Column(
         Numeric(precision=12, scale=2), nullable=False, default=0.00
     )
+    # Счетчик изменений: увеличивается при каждой операции и используется
+    # для оптимистичной блокировки и ETag.
+    version = Column(Integer, nullable=False, default=0, server_default="0")
 
     def __repr__(self) -> str:
         return f"<Wallet(id='{self.id}', balance={self.balance})>"
+
+
+class Operation(Base):
+    """
+    Модель, представляющая таблицу 'wallet_operations' - историю операций.
+    Каждая запись фиксирует одну операцию и баланс кошелька после нее.
+    """
+
+    __tablename__ = "wallet_operations"
+
+    id = Column(BigInteger, primary_key=True, autoincrement=True)
+    wallet_id = Column(String, ForeignKey("wallets.id"), nullable=False)
+    operation_type = Column(String(16), nullable=False)
+    amount = Column(Numeric(precision=12, scale=2), nullable=False)
+    balance_after = Column(Numeric(precision=12, scale=2), nullable=False)
+    # Время назначает БД в момент вставки строки (а не начала
+    # транзакции): агрегатор статистики сравнивает его со временем
+    # начала незавершенных транзакций той же БД.
+    created_at = Column(
+        DateTime(timezone=True),
+        nullable=False,
+        server_default=func.clock_timestamp(),
+    )
+
+    __table_args__ = (
+        # Покрывающий индекс для постраничного чтения истории кошелька:
+        # выборка по (wallet_id, created_at, id) обслуживается index-only
+        # scan, и глубокие страницы стоят столько же, сколько первая.
+        Index(
+            "ix_wallet_operations_history",
+            "wallet_id",
+            "created_at",
+            "id",
+            postgresql_include=["operation_type", "amount", "balance_after"],
+        ),
+    )
+
+    def __repr__(self) -> str:
+        return (
+            f"<Operation(id={self.id}, wallet_id='{self.wallet_id}', "
+            f"operation_type='{self.operation_type}', amount={self.amount})>"
+        )
+
+
+class StatsRollup(Base):
+    """
+    Модель, представляющая таблицу 'stats_rollups' - агрегаты операций
+    за час или сутки. Обновляется агрегатором инкрементально.
+    """
+
+    __tablename__ = "stats_rollups"
+
+    granularity = Column(String(8), nullable=False)
+    bucket_start = Column(DateTime(timezone=True), nullable=False)
+    deposits_count = Column(BigInteger, nullable=False, default=0)
+    deposits_amount = Column(
+        Numeric(precision=20, scale=2), nullable=False, default=0
+    )
+    withdrawals_count = Column(BigInteger, nullable=False, default=0)
+    withdrawals_amount = Column(
+        Numeric(precision=20, scale=2), nullable=False, default=0
+    )
+    active_wallets = Column(BigInteger, nullable=False, default=0)
+
+    __table_args__ = (PrimaryKeyConstraint("granularity", "bucket_start"),)
+
+
+class StatsActiveWallet(Base):
+    """
+    Модель, представляющая таблицу 'stats_active_wallets' - кошельки,
+    уже учтенные в active_wallets интервала. Нужна для точного подсчета
+    уникальных кошельков; записи закрытых интервалов удаляются.
+    """
+
+    __tablename__ = "stats_active_wallets"
+
+    granularity = Column(String(8), nullable=False)
+    bucket_start = Column(DateTime(timezone=True), nullable=False)
+    wallet_id = Column(String, nullable=False)
+
+    __table_args__ = (
+        PrimaryKeyConstraint("granularity", "bucket_start", "wallet_id"),
+    )
+
+
+class StatsWatermark(Base):
+    """
+    Модель, представляющая таблицу 'stats_watermark' - ID последней
+    операции, учтенной агрегатором.
+    """
+
+    __tablename__ = "stats_watermark"
+
+    id = Column(Integer, primary_key=True)
+    last_operation_id = Column(BigInteger, nullable=False, default=0)
+
+
+class OperationArchiveSegment(Base):
+    """
+    Модель, представляющая таблицу 'operation_archive_segments' - индекс
+    файлов архива истории операций.
+
+    Для каждого сегмента хранятся диапазоны wallet_id и created_at, по
+    которым чтение архива отбирает нужные файлы, и смещения сжатых блоков
+    внутри файла (первый wallet_id блока, смещение, длина).
+    """
+
+    __tablename__ = "operation_archive_segments"
+
+    id = Column(BigInteger, primary_key=True, autoincrement=True)
+    path = Column(String, nullable=False, unique=True)
+    # Побайтовое сравнение (COLLATE "C") совпадает с порядком строк
+    # в Python, в котором отсортированы сегменты.
+    wallet_id_min = Column(String(collation="C"), nullable=False)
+    wallet_id_max = Column(String(collation="C"), nullable=False)
+    created_from = Column(DateTime(timezone=True), nullable=False)
+    created_to = Column(DateTime(timezone=True), nullable=False)
+    operation_id_min = Column(BigInteger, nullable=False)
+    operation_id_max = Column(BigInteger, nullable=False)
+    operations = Column(BigInteger, nullable=False)
+    blocks = Column(JSONB, nullable=False)
+    archived_at = Column(
+        DateTime(timezone=True),
+        nullable=False,
+        default=lambda: datetime.now(timezone.utc),
+        server_default=func.now(),
+    )
+
+    __table_args__ = (
+        Index(
+            "ix_operation_archive_segments_wallets",
+            "wallet_id_min",
+            "wallet_id_max",
+        ),
+    )
+
+
+class WalletArchivedTotal(Base):
+    """
+    Модель, представляющая таблицу 'wallet_archived_totals' - итоги
+    операций кошелька, перенесенных в архив. Нужна сверке балансов
+    с историей, когда часть истории уже не хранится в БД.
+    """
+
+    __tablename__ = "wallet_archived_totals"
+
+    wallet_id = Column(String, primary_key=True)
+    net_amount = Column(
+        Numeric(precision=20, scale=2), nullable=False, default=0
+    )
+    operations = Column(BigInteger, nullable=False, default=0)
+
+
+class WalletImportAdjustment(Base):
+    """
+    Модель, представляющая таблицу 'wallet_import_adjustments' - сумма
+    изменений баланса кошелька массовой загрузкой. Такие изменения не
+    записываются в историю операций, и сверка балансов учитывает их
+    отдельно.
+    """
+
+    __tablename__ = "wallet_import_adjustments"
+
+    wallet_id = Column(String, primary_key=True)
+    net_amount = Column(
+        Numeric(precision=20, scale=2), nullable=False, default=0
+    )
@@ -0,0 +1,32 @@
+import base64
+from datetime import datetime
+from typing import Tuple
+
+
+def encode_cursor(created_at: datetime, operation_id: int) -> str:
+    """
+    Закодировать позицию в истории операций в непрозрачный курсор.
+
+    :param created_at: Время последней операции на странице
+    :param operation_id: ID последней операции на странице
+    :return: Строка курсора для параметра cursor
+    """
+    raw = f"{created_at.isoformat()}|{operation_id}".encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Tuple[datetime, int]:
+    """
+    Раскодировать курсор, полученный от encode_cursor.
+
+    :param cursor: Строка курсора
+    :return: Кортеж (created_at, id) последней просмотренной операции
+    :raises ValueError: Если курсор поврежден
+    """
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        raw = base64.urlsafe_b64decode(padded.encode()).decode()
+        created_at, operation_id = raw.rsplit("|", 1)
+        return datetime.fromisoformat(created_at), int(operation_id)
+    except (ValueError, UnicodeDecodeError) as e:
+        raise ValueError("Invalid cursor") from e
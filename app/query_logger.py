@@ -0,0 +1,177 @@
+import logging
+import random
+import re
+import time
+from contextvars import ContextVar
+from typing import Any, Optional
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+from app.config import settings
+
+logger = logging.getLogger("app.slow_queries")
+
+# ID кошелька, с которым работает текущий запрос. Устанавливается
+# репозиторием и попадает в лог медленных запросов.
+current_wallet_id: ContextVar[Optional[str]] = ContextVar(
+    "current_wallet_id", default=None
+)
+
+_START_TIMES_KEY = "query_logger_start_times"
+_LOCKING_CLAUSE = re.compile(
+    r"\bFOR\s+(NO\s+KEY\s+)?(UPDATE|SHARE)\b", re.IGNORECASE
+)
+
+
+def redact_parameters(parameters: Any) -> Any:
+    """
+    Заменить значения параметров запроса их типами.
+
+    Суммы и идентификаторы не должны попадать в лог, но типы и
+    количество параметров помогают понять, какой запрос был выполнен.
+
+    :param parameters: Параметры в формате DBAPI (кортеж, словарь или
+    список наборов параметров для executemany)
+    :return: Параметры с замененными значениями
+    """
+    if isinstance(parameters, dict):
+        return {key: _redact_value(value) for key, value in parameters.items()}
+    if isinstance(parameters, list):
+        return [redact_parameters(item) for item in parameters]
+    if isinstance(parameters, tuple):
+        return tuple(_redact_value(value) for value in parameters)
+    return _redact_value(parameters)
+
+
+def _redact_value(value: Any) -> str:
+    if value is None:
+        return "NULL"
+    if isinstance(value, (dict, list, tuple)):
+        return str(redact_parameters(value))
+    return f"<{type(value).__name__}>"
+
+
+def is_lock_wait(statement: str) -> bool:
+    """
+    Проверить, что запрос берет блокировку строк (SELECT ... FOR UPDATE).
+
+    Такие запросы выбирают одну строку по первичному ключу, поэтому их
+    долгое выполнение почти целиком состоит из ожидания блокировки.
+    Проверка синтаксическая: UPDATE, ожидающий блокировки строки,
+    получает lock_wait=False, хотя ждал того же самого.
+    """
+    return _LOCKING_CLAUSE.search(statement) is not None
+
+
+class SlowQueryLogger:
+    """
+    Логгер медленных запросов на событиях курсора SQLAlchemy.
+
+    Записывает только запросы дольше порога, причем лишь долю из них
+    (sample_rate), чтобы быстрые запросы ничего не стоили, а медленные
+    не заливали лог при деградации БД. Запросы, завершившиеся ошибкой
+    (lock_timeout, deadlock, отмена), записываются так же, с полем error.
+    Поле lock_wait - эвристика по тексту запроса (см. is_lock_wait).
+    """
+
+    def __init__(
+        self,
+        threshold_ms: float,
+        sample_rate: float = 1.0,
+        log_parameters: bool = False,
+    ):
+        self.threshold = threshold_ms / 1000
+        self.sample_rate = sample_rate
+        self.log_parameters = log_parameters
+
+    def install(self, engine: Engine) -> None:
+        """Подписаться на события курсора синхронного движка."""
+        event.listen(engine, "before_cursor_execute", self.before_execute)
+        event.listen(engine, "after_cursor_execute", self.after_execute)
+        event.listen(engine, "handle_error", self.handle_error)
+
+    def uninstall(self, engine: Engine) -> None:
+        """Отписаться от событий движка."""
+        event.remove(engine, "before_cursor_execute", self.before_execute)
+        event.remove(engine, "after_cursor_execute", self.after_execute)
+        event.remove(engine, "handle_error", self.handle_error)
+
+    def before_execute(
+        self, conn, cursor, statement, parameters, context, executemany
+    ) -> None:
+        conn.info.setdefault(_START_TIMES_KEY, []).append(time.perf_counter())
+
+    def after_execute(
+        self, conn, cursor, statement, parameters, context, executemany
+    ) -> None:
+        self._finish(conn, statement, parameters)
+
+    def handle_error(self, context) -> None:
+        # after_cursor_execute не вызывается для запросов с ошибкой:
+        # без этого обработчика время их начала оставалось бы в стеке,
+        # а сами запросы (часто самые долгие) не попадали бы в лог.
+        if context.connection is None or context.cursor is None:
+            return
+        self._finish(
+            context.connection,
+            context.statement,
+            context.parameters,
+            context.original_exception,
+        )
+
+    def _finish(
+        self,
+        conn,
+        statement: str,
+        parameters: Any,
+        error: Optional[BaseException] = None,
+    ) -> None:
+        start_times = conn.info.get(_START_TIMES_KEY)
+        if not start_times:
+            return
+        elapsed = time.perf_counter() - start_times.pop()
+        if elapsed < self.threshold:
+            return
+        if self.sample_rate < 1.0 and random.random() >= self.sample_rate:
+            return
+        self.on_slow_query(statement, parameters, elapsed, error)
+
+    def on_slow_query(
+        self,
+        statement: str,
+        parameters: Any,
+        elapsed: float,
+        error: Optional[BaseException] = None,
+    ) -> None:
+        """Записать медленный запрос в лог."""
+        if not self.log_parameters:
+            parameters = redact_parameters(parameters)
+        logger.warning(
+            "slow query duration_ms=%.1f wallet_id=%s lock_wait=%s "
+            "error=%s statement=%s parameters=%s",
+            elapsed * 1000,
+            current_wallet_id.get(),
+            is_lock_wait(statement),
+            type(error).__name__ if error is not None else None,
+            " ".join(statement.split()),
+            parameters,
+        )
+
+
+def install_slow_query_logger(engine: Engine) -> Optional[SlowQueryLogger]:
+    """
+    Подключить логгер медленных запросов к движку согласно настройкам.
+
+    :param engine: Синхронный движок (для AsyncEngine - engine.sync_engine)
+    :return: Установленный логгер или None, если логирование отключено
+    """
+    if settings.SLOW_QUERY_THRESHOLD_MS < 0:
+        return None
+    query_logger = SlowQueryLogger(
+        threshold_ms=settings.SLOW_QUERY_THRESHOLD_MS,
+        sample_rate=settings.SLOW_QUERY_SAMPLE_RATE,
+        log_parameters=settings.SLOW_QUERY_LOG_PARAMETERS,
+    )
+    query_logger.install(engine)
+    return query_logger
@@ -0,0 +1,54 @@
+from abc import ABC, abstractmethod
+from decimal import Decimal
+from typing import Any, Optional
+
+
+class BaseWalletRepository(ABC):
+    """
+    Интерфейс хранилища кошельков.
+
+    Кошелек, возвращаемый реализациями, имеет атрибуты id, balance
+    (Decimal) и version. История операций есть только в PostgreSQL
+    и читается через WalletRepository.
+    """
+
+    @abstractmethod
+    async def get_wallet(self, wallet_id: str) -> Optional[Any]:
+        """
+        Получить кошелек по ID.
+
+        :param wallet_id: UUID кошелька
+        :return: Кошелек или None
+        """
+
+    @abstractmethod
+    async def update_balance(
+        self, wallet_id: str, operation_type: str, amount: Decimal
+    ) -> Any:
+        """
+        Изменить баланс кошелька с проверкой на достаточность средств.
+
+        :param wallet_id: UUID кошелька
+        :param operation_type: 'DEPOSIT' или 'WITHDRAW'
+        :param amount: Сумма операции
+        :return: Обновленный кошелек
+        :raises ValueError: При недостаточном балансе, неверной операции
+        или отсутствии кошелька
+        """
+
+
+def apply_operation(
+    balance: Decimal, operation_type: str, amount: Decimal
+) -> Decimal:
+    """
+    Вычислить новый баланс после операции.
+
+    :raises ValueError: При недостаточном балансе или неверной операции
+    """
+    if operation_type == "DEPOSIT":
+        return balance + amount
+    if operation_type == "WITHDRAW":
+        if balance < amount:
+            raise ValueError("Insufficient funds")
+        return balance - amount
+    raise ValueError("Invalid operation type")
@@ -0,0 +1,56 @@
+import time
+from decimal import Decimal
+from typing import Optional
+
+from app.hot_wallets import profiler
+from app.memory_store import MemoryWallet, MemoryWalletStore
+from app.repositories.base import BaseWalletRepository, apply_operation
+
+
+class MemoryWalletRepository(BaseWalletRepository):
+    """Репозиторий кошельков поверх хранилища в памяти."""
+
+    def __init__(self, store: MemoryWalletStore):
+        self.store = store
+
+    async def get_wallet(self, wallet_id: str) -> Optional[MemoryWallet]:
+        """
+        Получить кошелек по ID.
+
+        :param wallet_id: UUID кошелька
+        :return: Объект MemoryWallet или None
+        """
+        return self.store.get(wallet_id)
+
+    async def update_balance(
+        self, wallet_id: str, operation_type: str, amount: Decimal
+    ) -> MemoryWallet:
+        """
+        Изменить баланс кошелька с проверкой на достаточность средств.
+
+        Операции одного кошелька выполняются по очереди под блокировкой
+        его полосы; ответ возвращается после записи в журнал.
+
+        :param wallet_id: UUID кошелька
+        :param operation_type: 'DEPOSIT' или 'WITHDRAW'
+        :param amount: Сумма операции
+        :return: Обновленный объект MemoryWallet
+        :raises ValueError: При недостаточном балансе, неверной операции
+        или отсутствии кошелька
+        """
+        lock_started = time.perf_counter()
+        async with self.store.lock(wallet_id):
+            profiler.record_operation(
+                wallet_id, lock_wait=time.perf_counter() - lock_started
+            )
+            wallet = self.store.get(wallet_id)
+            if wallet is None:
+                # Если кошелек не существует, создаем его (для пополнения)
+                if operation_type != "DEPOSIT":
+                    raise ValueError("Wallet not found")
+                wallet = MemoryWallet(wallet_id, Decimal("0.00"), 0)
+
+            balance = apply_operation(wallet.balance, operation_type, amount)
+            return await self.store.put(
+                wallet_id, balance, wallet.version + 1
+            )
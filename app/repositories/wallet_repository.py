@@ -1,18 +1,28 @@
+import asyncio
+import json
+import random
+import time
+from datetime import datetime
 from decimal import Decimal
-from typing import Optional
+from typing import List, Optional, Tuple
 
-from sqlalchemy import select
-from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy import func, select, tuple_, update
+from sqlalchemy.exc import IntegrityError, SQLAlchemyError
 from sqlalchemy.ext.asyncio import AsyncSession
 
-from app.models import Wallet
+from app.config import settings
+from app.hot_wallets import profiler
+from app.models import Operation, Wallet
+from app.query_logger import current_wallet_id
+from app.repositories.base import BaseWalletRepository, apply_operation
 
 
-class WalletRepository:
-    """Репозиторий для операций с кошельками."""
+class WalletRepository(BaseWalletRepository):
+    """Репозиторий для операций с кошельками в PostgreSQL."""
 
-    def __init__(self, db: AsyncSession):
+    def __init__(self, db: AsyncSession, update_mode: Optional[str] = None):
         self.db = db
+        self.update_mode = update_mode or settings.WALLET_UPDATE_MODE
 
     async def get_wallet(
         self, wallet_id: str, for_update: bool = False
@@ -25,6 +35,7 @@ class WalletRepository:
         (SELECT FOR UPDATE)
         :return: Объект Wallet или None
         """
+        current_wallet_id.set(wallet_id)
         query = select(Wallet).where(Wallet.id == wallet_id)
 
         if for_update:
@@ -40,7 +51,7 @@ class WalletRepository:
         :param wallet_id: UUID кошелька
         :return: Созданный объект Wallet
         """
-        wallet = Wallet(id=wallet_id, balance=Decimal("0.00"))
+        wallet = Wallet(id=wallet_id, balance=Decimal("0.00"), version=0)
         self.db.add(wallet)
         await self.db.commit()
         await self.db.refresh(wallet)
@@ -52,35 +63,26 @@ class WalletRepository:
         """
         Изменить баланс кошелька с проверкой на достаточность средств.
 
+        Способ защиты от параллельных изменений задается update_mode:
+        'pessimistic' блокирует строку (SELECT FOR UPDATE), 'optimistic'
+        обновляет строку только если ее версия не изменилась с момента
+        чтения, и повторяет попытку при конфликте.
+
         :param wallet_id: UUID кошелька
         :param operation_type: 'DEPOSIT' или 'WITHDRAW'
         :param amount: Сумма операции
         :return: Обновленный объект Wallet или None в случае ошибки
-        :raises ValueError: При недостаточном балансе или неверной операции
+        :raises ValueError: При недостаточном балансе, неверной операции
+        или исчерпании попыток в оптимистичном режиме
         """
         try:
-            # Начинаем транзакцию и блокируем запись
-            wallet = await self.get_wallet(wallet_id, for_update=True)
-
-            if not wallet:
-                # Если кошелек не существует, создаем его (для пополнения)
-                if operation_type == "DEPOSIT":
-                    wallet = await self.create_wallet(wallet_id)
-                else:
-                    raise ValueError("Wallet not found")
-
-            if operation_type == "DEPOSIT":
-                wallet.balance += amount
-            elif operation_type == "WITHDRAW":
-                if wallet.balance < amount:
-                    raise ValueError("Insufficient funds")
-                wallet.balance -= amount
-            else:
-                raise ValueError("Invalid operation type")
-
-            await self.db.commit()
-            await self.db.refresh(wallet)
-            return wallet
+            if self.update_mode == "optimistic":
+                return await self._update_balance_optimistic(
+                    wallet_id, operation_type, amount
+                )
+            return await self._update_balance_pessimistic(
+                wallet_id, operation_type, amount
+            )
 
         except SQLAlchemyError as e:
             await self.db.rollback()
@@ -88,3 +90,177 @@ class WalletRepository:
         except ValueError as e:
             await self.db.rollback()
             raise e
+
+    async def _update_balance_pessimistic(
+        self, wallet_id: str, operation_type: str, amount: Decimal
+    ) -> Wallet:
+        # Начинаем транзакцию и блокируем запись
+        lock_started = time.perf_counter()
+        wallet = await self.get_wallet(wallet_id, for_update=True)
+        profiler.record_operation(
+            wallet_id, lock_wait=time.perf_counter() - lock_started
+        )
+
+        if not wallet:
+            # Если кошелек не существует, создаем его (для пополнения)
+            if operation_type == "DEPOSIT":
+                wallet = await self.create_wallet(wallet_id)
+            else:
+                raise ValueError("Wallet not found")
+
+        wallet.balance = apply_operation(wallet.balance, operation_type, amount)
+        wallet.version += 1
+
+        await self._record_operation(wallet, operation_type, amount)
+        await self.db.commit()
+        await self.db.refresh(wallet)
+        return wallet
+
+    async def _update_balance_optimistic(
+        self, wallet_id: str, operation_type: str, amount: Decimal
+    ) -> Wallet:
+        # Ожиданием считается только время после первого конфликта:
+        # запись без конфликтов не попадает в рейтинг по ожиданию.
+        contended: Optional[float] = None
+        for attempt in range(settings.OPTIMISTIC_MAX_RETRIES):
+            # Читаем без блокировки; populate_existing перечитывает
+            # кошелек, даже если он уже загружен в сессию.
+            result = await self.db.execute(
+                select(Wallet)
+                .where(Wallet.id == wallet_id)
+                .execution_options(populate_existing=True)
+            )
+            wallet = result.scalar_one_or_none()
+
+            if not wallet:
+                if operation_type != "DEPOSIT":
+                    raise ValueError("Wallet not found")
+                try:
+                    wallet = await self.create_wallet(wallet_id)
+                except IntegrityError:
+                    # Кошелек создан параллельным запросом
+                    await self.db.rollback()
+                    if contended is None:
+                        contended = time.perf_counter()
+                    continue
+
+            new_balance = apply_operation(
+                wallet.balance, operation_type, amount
+            )
+            result = await self.db.execute(
+                update(Wallet)
+                .where(Wallet.id == wallet_id, Wallet.version == wallet.version)
+                .values(balance=new_balance, version=Wallet.version + 1)
+                .execution_options(synchronize_session=False)
+            )
+
+            if result.rowcount == 1:
+                profiler.record_operation(
+                    wallet_id, lock_wait=self._waited(contended)
+                )
+                await self._record_operation(
+                    wallet, operation_type, amount,
+                    balance_after=new_balance, version=wallet.version + 1,
+                )
+                await self.db.commit()
+                await self.db.refresh(wallet)
+                return wallet
+
+            # Версия изменилась: кошелек обновлен параллельным запросом
+            await self.db.rollback()
+            if contended is None:
+                contended = time.perf_counter()
+            # После последней попытки ждать нечего: сразу отвечаем 409
+            if attempt + 1 < settings.OPTIMISTIC_MAX_RETRIES:
+                await asyncio.sleep(random.uniform(0, 0.002 * 2 ** attempt))
+
+        profiler.record_operation(wallet_id, lock_wait=self._waited(contended))
+        raise ValueError("Concurrent update conflict")
+
+    @staticmethod
+    def _waited(contended: Optional[float]) -> float:
+        if contended is None:
+            return 0.0
+        return time.perf_counter() - contended
+
+    async def _record_operation(
+        self,
+        wallet: Wallet,
+        operation_type: str,
+        amount: Decimal,
+        balance_after: Optional[Decimal] = None,
+        version: Optional[int] = None,
+    ) -> None:
+        """
+        Записать операцию в историю и отправить NOTIFY с новым балансом.
+
+        Уведомление доставляется слушателям только при коммите
+        транзакции, поэтому откаченные изменения не публикуются.
+        """
+        if balance_after is None:
+            balance_after = wallet.balance
+        if version is None:
+            version = wallet.version
+        self.db.add(
+            Operation(
+                wallet_id=wallet.id,
+                operation_type=operation_type,
+                amount=amount,
+                balance_after=balance_after,
+            )
+        )
+        payload = json.dumps(
+            {
+                "wallet_id": wallet.id,
+                "balance": str(balance_after),
+                "version": version,
+            }
+        )
+        await self.db.execute(
+            select(func.pg_notify(settings.BALANCE_CHANNEL, payload))
+        )
+
+    async def list_operations(
+        self,
+        wallet_id: str,
+        limit: int,
+        after: Optional[Tuple[datetime, int]] = None,
+        operation_type: Optional[str] = None,
+        created_from: Optional[datetime] = None,
+        created_to: Optional[datetime] = None,
+    ) -> List[Operation]:
+        """
+        Получить страницу истории операций кошелька, от новых к старым.
+
+        Используется keyset-пагинация по (created_at, id): вместо OFFSET
+        следующая страница начинается строго после последней записи
+        предыдущей, поэтому стоимость запроса не зависит от глубины.
+
+        :param wallet_id: UUID кошелька
+        :param limit: Максимальное количество операций на странице
+        :param after: (created_at, id) последней операции предыдущей
+        страницы или None для первой страницы
+        :param operation_type: Фильтр по типу операции
+        :param created_from: Нижняя граница времени (включительно)
+        :param created_to: Верхняя граница времени (не включительно)
+        :return: Список объектов Operation
+        """
+        current_wallet_id.set(wallet_id)
+        query = select(Operation).where(Operation.wallet_id == wallet_id)
+
+        if after is not None:
+            query = query.where(
+                tuple_(Operation.created_at, Operation.id) < tuple_(*after)
+            )
+        if operation_type is not None:
+            query = query.where(Operation.operation_type == operation_type)
+        if created_from is not None:
+            query = query.where(Operation.created_at >= created_from)
+        if created_to is not None:
+            query = query.where(Operation.created_at < created_to)
+
+        query = query.order_by(
+            Operation.created_at.desc(), Operation.id.desc()
+        ).limit(limit)
+        result = await self.db.execute(query)
+        return list(result.scalars().all())
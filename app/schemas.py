@@ -1,5 +1,7 @@
+from datetime import datetime
 from decimal import Decimal
 from enum import Enum
+from typing import List, Optional
 
 from pydantic import BaseModel, ConfigDict, Field, field_validator
 
@@ -48,3 +50,60 @@ class OperationResponse(BaseModel):
     amount: float
     new_balance: float
     message: str = "Operation successful"
+
+
+class OperationItem(BaseModel):
+    """Схема для записи истории операций."""
+
+    model_config = ConfigDict(from_attributes=True)
+
+    id: int
+    operation_type: OperationType
+    amount: float
+    balance_after: float
+    created_at: datetime
+
+
+class OperationsPage(BaseModel):
+    """Схема для страницы истории операций."""
+
+    wallet_id: str
+    items: List[OperationItem]
+    next_cursor: Optional[str] = None
+
+
+class HotWallet(BaseModel):
+    """Кошелек из рейтинга самых нагруженных."""
+
+    wallet_id: str
+    value: float
+    error: float
+
+
+class HotWalletsResponse(BaseModel):
+    """Схема для ответа со статистикой «горячих» кошельков."""
+
+    window_seconds: float
+    by_operations: List[HotWallet]
+    by_lock_wait_ms: List[HotWallet]
+
+
+class StatsBucket(BaseModel):
+    """Агрегаты операций за один интервал."""
+
+    bucket_start: datetime
+    deposits_count: int
+    deposits_amount: float
+    withdrawals_count: int
+    withdrawals_amount: float
+    net_flow: float
+    active_wallets: int
+
+
+class StatsResponse(BaseModel):
+    """Схема для ответа со статистикой операций."""
+
+    granularity: str
+    start: datetime
+    end: datetime
+    buckets: List[StatsBucket]
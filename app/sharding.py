@@ -0,0 +1,100 @@
+import bisect
+import hashlib
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy.ext.asyncio import (
+    AsyncEngine,
+    AsyncSession,
+    async_sessionmaker,
+    create_async_engine,
+)
+
+
+def _hash(key: str) -> int:
+    digest = hashlib.blake2b(key.encode(), digest_size=8).digest()
+    return int.from_bytes(digest, "big")
+
+
+def shard_names(count: int) -> List[str]:
+    """Имена шардов по их позиции в списке SHARD_DATABASE_URLS."""
+    return [f"shard{i}" for i in range(count)]
+
+
+def asyncpg_dsns(urls: Iterable[str]) -> List[str]:
+    """Строки подключения SQLAlchemy в формате asyncpg (без +asyncpg)."""
+    return [url.replace("+asyncpg", "") for url in urls]
+
+
+class HashRing:
+    """
+    Кольцо консистентного хеширования с виртуальными узлами.
+
+    Каждый шард занимает vnodes точек на кольце, ключ принадлежит
+    ближайшей точке по часовой стрелке. При добавлении шарда к нему
+    переходит лишь около 1/N ключей, остальные остаются на месте.
+    """
+
+    def __init__(self, nodes: List[str], vnodes: int = 128):
+        self.nodes = list(nodes)
+        points: List[Tuple[int, str]] = sorted(
+            (_hash(f"{node}#{i}"), node)
+            for node in self.nodes
+            for i in range(vnodes)
+        )
+        self._hashes = [point for point, _ in points]
+        self._owners = [node for _, node in points]
+
+    def node_for(self, key: str) -> str:
+        """Вернуть шард, которому принадлежит ключ."""
+        if len(self.nodes) == 1:
+            return self.nodes[0]
+        index = bisect.bisect(self._hashes, _hash(key)) % len(self._hashes)
+        return self._owners[index]
+
+
+class ShardRouter:
+    """
+    Маршрутизатор кошельков по шардам (отдельным базам PostgreSQL).
+
+    Для каждого шарда создается свой движок с собственным пулом
+    соединений; кошелек и его история операций целиком хранятся на
+    шарде, который выбирает кольцо консистентного хеширования.
+    """
+
+    def __init__(self, urls: List[str], **engine_kwargs):
+        self.names = shard_names(len(urls))
+        self.urls: Dict[str, str] = dict(zip(self.names, urls))
+        self.ring = HashRing(self.names)
+        self.engines: Dict[str, AsyncEngine] = {
+            name: create_async_engine(url, **engine_kwargs)
+            for name, url in self.urls.items()
+        }
+        self.sessionmakers: Dict[str, async_sessionmaker] = {
+            name: async_sessionmaker(
+                bind=engine,
+                class_=AsyncSession,
+                expire_on_commit=False,
+                autoflush=False,
+            )
+            for name, engine in self.engines.items()
+        }
+
+    @property
+    def default_shard(self) -> str:
+        """Шард для запросов, не относящихся к конкретному кошельку."""
+        return self.names[0]
+
+    def shard_for(self, wallet_id: Optional[str]) -> str:
+        """Вернуть имя шарда кошелька."""
+        if wallet_id is None:
+            return self.default_shard
+        return self.ring.node_for(wallet_id)
+
+    def sessionmaker_for(self, wallet_id: Optional[str]) -> async_sessionmaker:
+        """Фабрика сессий шарда, на котором хранится кошелек."""
+        return self.sessionmakers[self.shard_for(wallet_id)]
+
+    async def dispose(self) -> None:
+        """Закрыть пулы соединений всех шардов."""
+        for engine in self.engines.values():
+            await engine.dispose()
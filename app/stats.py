@@ -0,0 +1,314 @@
+import asyncio
+import logging
+from datetime import datetime, timedelta
+from math import ceil
+from typing import Dict, List, Optional
+
+from sqlalchemy import select, text
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession
+
+from app.config import settings
+from app.database import shard_router
+from app.models import StatsRollup
+
+logger = logging.getLogger(__name__)
+
+BUCKET_SIZES = {"hour": timedelta(hours=1), "day": timedelta(days=1)}
+
+# Граница учета: операции, вставленные позже, еще могут стоять за
+# незафиксированными операциями с меньшими ID. Незавершенная транзакция
+# получает ID своей операции после начала (xact_start), поэтому любая
+# операция, вставленная раньше начала всех текущих транзакций, не
+# обгоняет невидимых операций с меньшими ID - сколько бы транзакция
+# ни ждала блокировку. Вычисляется отдельным запросом до снимка данных
+# прохода: транзакция, завершившаяся между ними, уже видна в снимке.
+# Роль агрегатора должна видеть xact_start чужих сессий (та же роль,
+# что у приложения, или pg_read_all_stats).
+_CUTOFF_SQL = text(
+    """
+    SELECT least(
+        clock_timestamp() - make_interval(secs => :lag),
+        (
+            SELECT min(xact_start) FROM pg_stat_activity
+            WHERE datname = current_database()
+              AND pid <> pg_backend_pid()
+        )
+    )
+    """
+)
+
+# Один проход агрегатора: берет пачку еще не учтенных операций,
+# вставленных до границы учета, добавляет их суммы в агрегаты часа
+# и суток и сдвигает watermark.
+# Уникальные кошельки считаются через stats_active_wallets: счетчик
+# увеличивается только для впервые вставленных пар (интервал, кошелек).
+_AGGREGATE_SQL = text(
+    """
+    WITH watermark AS (
+        SELECT last_operation_id FROM stats_watermark WHERE id = 1
+        FOR UPDATE
+    ),
+    batch AS (
+        SELECT o.id, o.wallet_id, o.operation_type, o.amount, o.created_at
+        FROM wallet_operations o, watermark w
+        WHERE o.id > w.last_operation_id
+          AND o.created_at < :cutoff
+        ORDER BY o.id
+        LIMIT :batch_size
+    ),
+    buckets AS (
+        SELECT
+            g.granularity,
+            date_trunc(g.granularity, b.created_at, 'UTC') AS bucket_start,
+            b.wallet_id,
+            b.operation_type,
+            b.amount
+        FROM batch b
+        CROSS JOIN (VALUES ('hour'), ('day')) AS g (granularity)
+    ),
+    new_active AS (
+        INSERT INTO stats_active_wallets (granularity, bucket_start, wallet_id)
+        SELECT DISTINCT granularity, bucket_start, wallet_id FROM buckets
+        ON CONFLICT DO NOTHING
+        RETURNING granularity, bucket_start
+    ),
+    active AS (
+        SELECT granularity, bucket_start, count(*) AS active_wallets
+        FROM new_active
+        GROUP BY granularity, bucket_start
+    ),
+    totals AS (
+        SELECT
+            granularity,
+            bucket_start,
+            count(*) FILTER (WHERE operation_type = 'DEPOSIT')
+                AS deposits_count,
+            coalesce(sum(amount) FILTER (WHERE operation_type = 'DEPOSIT'), 0)
+                AS deposits_amount,
+            count(*) FILTER (WHERE operation_type = 'WITHDRAW')
+                AS withdrawals_count,
+            coalesce(sum(amount) FILTER (WHERE operation_type = 'WITHDRAW'), 0)
+                AS withdrawals_amount
+        FROM buckets
+        GROUP BY granularity, bucket_start
+    ),
+    upserted AS (
+        INSERT INTO stats_rollups (
+            granularity, bucket_start, deposits_count, deposits_amount,
+            withdrawals_count, withdrawals_amount, active_wallets
+        )
+        SELECT
+            t.granularity, t.bucket_start, t.deposits_count,
+            t.deposits_amount, t.withdrawals_count, t.withdrawals_amount,
+            coalesce(a.active_wallets, 0)
+        FROM totals t
+        LEFT JOIN active a USING (granularity, bucket_start)
+        ON CONFLICT (granularity, bucket_start) DO UPDATE SET
+            deposits_count =
+                stats_rollups.deposits_count + EXCLUDED.deposits_count,
+            deposits_amount =
+                stats_rollups.deposits_amount + EXCLUDED.deposits_amount,
+            withdrawals_count =
+                stats_rollups.withdrawals_count + EXCLUDED.withdrawals_count,
+            withdrawals_amount =
+                stats_rollups.withdrawals_amount
+                + EXCLUDED.withdrawals_amount,
+            active_wallets =
+                stats_rollups.active_wallets + EXCLUDED.active_wallets
+        RETURNING 1
+    )
+    UPDATE stats_watermark
+    SET last_operation_id = (SELECT max(id) FROM batch)
+    WHERE id = 1 AND EXISTS (SELECT 1 FROM batch)
+    RETURNING
+        (SELECT count(*) FROM batch) AS processed,
+        (SELECT count(*) FROM upserted) AS buckets
+    """
+)
+
+# Пары (интервал, кошелек) нужны, пока в интервал могут попасть новые
+# операции. Удаляются интервалы, закончившиеся раньше самой старой
+# неучтенной операции (с запасом в час).
+_PRUNE_ACTIVE_SQL = text(
+    """
+    DELETE FROM stats_active_wallets
+    WHERE bucket_start + CASE granularity
+            WHEN 'hour' THEN interval '1 hour' ELSE interval '1 day' END
+        < coalesce(
+            (
+                SELECT o.created_at FROM wallet_operations o
+                WHERE o.id > (
+                    SELECT last_operation_id FROM stats_watermark
+                    WHERE id = 1
+                )
+                ORDER BY o.id
+                LIMIT 1
+            ),
+            :cutoff
+        ) - interval '1 hour'
+    """
+)
+
+
+async def aggregate_stats(
+    engine: AsyncEngine, lag_seconds: float, batch_size: int
+) -> int:
+    """
+    Учесть в агрегатах все накопившиеся операции шарда.
+
+    Работает пачками по batch_size операций, каждая - в своей
+    транзакции. Параллельные агрегаторы сериализуются блокировкой
+    строки watermark.
+
+    :param engine: Движок шарда
+    :param lag_seconds: Операции моложе lag_seconds секунд откладываются
+    до следующего прохода (вместе с операциями, вставленными после начала
+    самой старой незавершенной транзакции)
+    :param batch_size: Количество операций в одной транзакции
+    :return: Количество учтенных операций
+    """
+    total = 0
+    async with engine.connect() as conn:
+        async with conn.begin():
+            await conn.execute(
+                text(
+                    "INSERT INTO stats_watermark (id, last_operation_id) "
+                    "VALUES (1, 0) ON CONFLICT DO NOTHING"
+                )
+            )
+        async with conn.begin():
+            cutoff = await conn.scalar(_CUTOFF_SQL, {"lag": lag_seconds})
+        while True:
+            async with conn.begin():
+                row = (
+                    await conn.execute(
+                        _AGGREGATE_SQL,
+                        {"cutoff": cutoff, "batch_size": batch_size},
+                    )
+                ).first()
+            if row is None:
+                break
+            total += row.processed
+            if row.processed < batch_size:
+                break
+        async with conn.begin():
+            await conn.execute(_PRUNE_ACTIVE_SQL, {"cutoff": cutoff})
+    return total
+
+
+class StatsAggregator:
+    """Фоновая задача, периодически обновляющая агрегаты всех шардов."""
+
+    def __init__(
+        self,
+        engines: List[AsyncEngine],
+        interval: float,
+        lag_seconds: float,
+        batch_size: int,
+    ):
+        self.engines = engines
+        self.interval = interval
+        self.lag_seconds = lag_seconds
+        self.batch_size = batch_size
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self) -> None:
+        """Запустить фоновую задачу."""
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        """Остановить фоновую задачу."""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self) -> None:
+        while True:
+            for engine in self.engines:
+                try:
+                    await aggregate_stats(
+                        engine, self.lag_seconds, self.batch_size
+                    )
+                except Exception:
+                    logger.exception("Stats aggregation failed")
+            await asyncio.sleep(self.interval)
+
+
+async def read_rollups(
+    sessions: List[AsyncSession],
+    granularity: str,
+    start: datetime,
+    end: datetime,
+) -> List[Dict]:
+    """
+    Прочитать агрегаты интервалов [start, end) и сложить их по шардам.
+
+    Кошельки разных шардов не пересекаются, поэтому active_wallets
+    тоже складывается.
+    """
+    query = (
+        select(StatsRollup)
+        .where(
+            StatsRollup.granularity == granularity,
+            StatsRollup.bucket_start >= start,
+            StatsRollup.bucket_start < end,
+        )
+        .order_by(StatsRollup.bucket_start)
+    )
+    results = await asyncio.gather(
+        *(session.execute(query) for session in sessions)
+    )
+
+    fields = (
+        "deposits_count",
+        "deposits_amount",
+        "withdrawals_count",
+        "withdrawals_amount",
+        "active_wallets",
+    )
+    zeros = dict.fromkeys(fields, 0)
+    merged: Dict[datetime, Dict] = {}
+    for result in results:
+        for rollup in result.scalars():
+            bucket = merged.setdefault(
+                rollup.bucket_start,
+                dict(bucket_start=rollup.bucket_start, **zeros),
+            )
+            for field in fields:
+                bucket[field] += getattr(rollup, field)
+    return [merged[key] for key in sorted(merged)]
+
+
+def bucket_count(granularity: str, start: datetime, end: datetime) -> int:
+    """Количество интервалов гранулярности в [start, end)."""
+    return ceil((end - start) / BUCKET_SIZES[granularity])
+
+
+aggregator = StatsAggregator(
+    engines=list(shard_router.engines.values()),
+    interval=settings.STATS_AGGREGATION_INTERVAL_SECONDS,
+    lag_seconds=settings.STATS_AGGREGATION_LAG_SECONDS,
+    batch_size=settings.STATS_AGGREGATION_BATCH_SIZE,
+)
+
+
+async def aggregate_all() -> int:
+    """Однократно обновить агрегаты всех шардов из настроек приложения."""
+    try:
+        total = 0
+        for engine in aggregator.engines:
+            total += await aggregate_stats(
+                engine, aggregator.lag_seconds, aggregator.batch_size
+            )
+        return total
+    finally:
+        await shard_router.dispose()
+
+
+if __name__ == "__main__":
+    print(f"Учтено операций: {asyncio.run(aggregate_all())}")
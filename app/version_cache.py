@@ -0,0 +1,51 @@
+from collections import OrderedDict
+from typing import Optional
+
+
+class WalletVersionCache:
+    """
+    Ограниченная LRU-карта «кошелек -> последняя известная версия».
+
+    Карта хранит только версии, которые не могут оказаться устаревшими,
+    пока процесс получает уведомления обо всех коммитах. При потере
+    уведомлений карта сбрасывается, а generation увеличивается: значения,
+    прочитанные из БД до сброса, больше не принимаются.
+    """
+
+    def __init__(self, max_size: int):
+        self.max_size = max_size
+        self.generation = 0
+        self._versions: "OrderedDict[str, int]" = OrderedDict()
+
+    def get(self, wallet_id: str) -> Optional[int]:
+        """Вернуть известную версию кошелька или None."""
+        version = self._versions.get(wallet_id)
+        if version is not None:
+            self._versions.move_to_end(wallet_id)
+        return version
+
+    def update(
+        self, wallet_id: str, version: int, generation: Optional[int] = None
+    ) -> None:
+        """
+        Запомнить версию кошелька, если она новее известной.
+
+        :param wallet_id: UUID кошелька
+        :param version: Версия кошелька
+        :param generation: Значение generation на момент чтения версии
+        из БД; если с тех пор карта сбрасывалась, версия не сохраняется
+        """
+        if generation is not None and generation != self.generation:
+            return
+        current = self._versions.get(wallet_id)
+        if current is not None and current >= version:
+            return
+        self._versions[wallet_id] = version
+        self._versions.move_to_end(wallet_id)
+        if len(self._versions) > self.max_size:
+            self._versions.popitem(last=False)
+
+    def clear(self) -> None:
+        """Сбросить все версии."""
+        self._versions.clear()
+        self.generation += 1
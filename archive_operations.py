@@ -0,0 +1,271 @@
+# archive_operations.py
+"""
+Перенос старой истории операций из PostgreSQL в архив.
+
+Операции старше срока хранения (--older-than-days, по умолчанию
+ARCHIVE_RETENTION_DAYS) выбираются пачками по --segment-size в порядке
+ID. Каждая пачка сортируется по (wallet_id, created_at, id)
+и записывается в неизменяемый сжатый сегмент в каталоге ARCHIVE_DIR,
+после чего в одной транзакции:
+- в operation_archive_segments добавляется индекс сегмента
+  (диапазоны wallet_id и created_at, смещения блоков);
+- операции удаляются из wallet_operations;
+- их суммы добавляются к wallet_archived_totals, по которым сверка
+  балансов учитывает архивную часть истории.
+
+Архивируются только операции, уже учтенные в статистике
+(stats_watermark), поэтому агрегатор статистики должен работать.
+Файл сегмента никогда не удаляется после записи: при обрыве соединения
+неизвестно, зафиксирована ли транзакция. Файлы без строки в индексе
+удаляет следующий запуск, повторный запуск безопасен. Запуски для одного
+шарда сериализуются advisory-блокировкой.
+
+Примеры:
+    python archive_operations.py --dry-run
+    python archive_operations.py --older-than-days 30
+"""
+import argparse
+import asyncio
+import json
+import sys
+import time
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from typing import List
+
+import asyncpg
+
+from app.archive import ArchivedOperation, write_segment
+from app.config import settings
+from app.sharding import asyncpg_dsns, shard_names
+
+SELECT_SQL = """
+    SELECT id, wallet_id, operation_type, amount, balance_after, created_at
+    FROM wallet_operations
+    WHERE created_at < $1
+      AND id <= coalesce(
+          (SELECT last_operation_id FROM stats_watermark WHERE id = 1), 0
+      )
+    ORDER BY id
+    LIMIT $2
+    FOR UPDATE
+"""
+
+COUNT_SQL = """
+    SELECT count(*) FROM wallet_operations
+    WHERE created_at < $1
+      AND id <= coalesce(
+          (SELECT last_operation_id FROM stats_watermark WHERE id = 1), 0
+      )
+"""
+
+INSERT_SEGMENT_SQL = """
+    INSERT INTO operation_archive_segments (
+        path, wallet_id_min, wallet_id_max, created_from, created_to,
+        operation_id_min, operation_id_max, operations, blocks
+    )
+    VALUES ($1, $2, $3, $4, $5, $6, $7, $8, $9::jsonb)
+"""
+
+# Удаление и пополнение итогов одним запросом: итоги считаются ровно
+# по тем строкам, которые удалены.
+DELETE_SQL = """
+    WITH deleted AS (
+        DELETE FROM wallet_operations
+        WHERE id = ANY($1::bigint[])
+        RETURNING wallet_id, operation_type, amount
+    )
+    INSERT INTO wallet_archived_totals (wallet_id, net_amount, operations)
+    SELECT
+        wallet_id,
+        sum(CASE WHEN operation_type = 'DEPOSIT'
+            THEN amount ELSE -amount END),
+        count(*)
+    FROM deleted
+    GROUP BY wallet_id
+    ON CONFLICT (wallet_id) DO UPDATE SET
+        net_amount = wallet_archived_totals.net_amount + EXCLUDED.net_amount,
+        operations = wallet_archived_totals.operations + EXCLUDED.operations
+"""
+
+# Держится до закрытия соединения: пока запуск работает, другой запуск
+# не примет его незафиксированный сегмент за лишний.
+LOCK_SQL = "SELECT pg_advisory_lock(hashtext('archive_operations'))"
+
+
+async def remove_orphan_segments(
+    conn: asyncpg.Connection, shard: str, archive_dir: Path
+) -> int:
+    """
+    Удалить файлы сегментов шарда, отсутствующие в индексе.
+
+    Такие файлы остаются от запусков, транзакция которых не была
+    зафиксирована. Вызывается под блокировкой LOCK_SQL.
+
+    :return: Количество удаленных файлов
+    """
+    directory = archive_dir / shard
+    if not directory.is_dir():
+        return 0
+    indexed = {
+        row["path"]
+        for row in await conn.fetch(
+            "SELECT path FROM operation_archive_segments "
+            "WHERE path LIKE $1",
+            f"{shard}/%",
+        )
+    }
+    removed = 0
+    for path in directory.iterdir():
+        if not path.name.endswith((".seg.gz", ".seg.gz.tmp")):
+            continue
+        if f"{shard}/{path.name}" not in indexed:
+            path.unlink(missing_ok=True)
+            removed += 1
+    return removed
+
+
+async def archive_segment(
+    conn: asyncpg.Connection,
+    shard: str,
+    archive_dir: Path,
+    cutoff: datetime,
+    segment_size: int,
+) -> int:
+    """
+    Перенести в архив одну пачку операций шарда.
+
+    :return: Количество перенесенных операций (0 - переносить нечего)
+    """
+    async with conn.transaction():
+        rows = await conn.fetch(SELECT_SQL, cutoff, segment_size)
+        if not rows:
+            return 0
+        operations: List[ArchivedOperation] = sorted(
+            (ArchivedOperation(*row) for row in rows),
+            key=lambda op: (op.wallet_id, op.created_at, op.id),
+        )
+        ids = [op.id for op in operations]
+        name = f"{shard}/{min(ids):020d}-{max(ids):020d}.seg.gz"
+        blocks = await asyncio.to_thread(
+            write_segment, archive_dir / name, operations
+        )
+
+        await conn.execute(
+            INSERT_SEGMENT_SQL,
+            name,
+            operations[0].wallet_id,
+            operations[-1].wallet_id,
+            min(op.created_at for op in operations),
+            max(op.created_at for op in operations),
+            min(ids),
+            max(ids),
+            len(operations),
+            json.dumps(blocks),
+        )
+        await conn.execute(DELETE_SQL, ids)
+    return len(operations)
+
+
+async def archive_shard(
+    shard: str,
+    dsn: str,
+    archive_dir: Path,
+    cutoff: datetime,
+    segment_size: int,
+    dry_run: bool,
+) -> int:
+    """Перенести в архив все подходящие операции шарда."""
+    conn = await asyncpg.connect(dsn)
+    try:
+        if dry_run:
+            return await conn.fetchval(COUNT_SQL, cutoff)
+
+        await conn.execute(LOCK_SQL)
+        removed = await remove_orphan_segments(conn, shard, archive_dir)
+        if removed:
+            print(f"{shard}: удалено файлов вне индекса: {removed}")
+
+        total = 0
+        started = time.perf_counter()
+        while True:
+            archived = await archive_segment(
+                conn, shard, archive_dir, cutoff, segment_size
+            )
+            if not archived:
+                break
+            total += archived
+            print(
+                f"{shard}: перенесено {total} операций "
+                f"за {time.perf_counter() - started:.1f} с"
+            )
+        return total
+    finally:
+        await conn.close()
+
+
+async def archive(
+    dsns: List[str],
+    archive_dir: Path,
+    older_than_days: int,
+    segment_size: int,
+    dry_run: bool,
+) -> int:
+    """Перенести в архив операции всех шардов."""
+    cutoff = datetime.now(timezone.utc) - timedelta(days=older_than_days)
+    total = 0
+    for shard, dsn in zip(shard_names(len(dsns)), dsns):
+        total += await archive_shard(
+            shard, dsn, archive_dir, cutoff, segment_size, dry_run
+        )
+
+    action = "Подлежит переносу" if dry_run else "Перенесено"
+    print(f"{action} операций старше {cutoff.isoformat()}: {total}")
+    return total
+
+
+def main() -> int:
+    """Основная функция."""
+    parser = argparse.ArgumentParser(
+        description="Перенос старой истории операций в архив"
+    )
+    parser.add_argument(
+        "--older-than-days", type=int, default=settings.ARCHIVE_RETENTION_DAYS,
+        help="Срок хранения операций в БД, суток",
+    )
+    parser.add_argument(
+        "--segment-size", type=int, default=settings.ARCHIVE_SEGMENT_SIZE,
+        help="Операций в одном сегменте архива",
+    )
+    parser.add_argument(
+        "--archive-dir", default=settings.ARCHIVE_DIR,
+        help="Каталог архива (по умолчанию ARCHIVE_DIR)",
+    )
+    parser.add_argument(
+        "--dry-run", action="store_true",
+        help="Только подсчитать операции, которые будут перенесены",
+    )
+    parser.add_argument(
+        "--dsn", action="append",
+        help="Строка подключения шарда (в порядке SHARD_DATABASE_URLS); "
+        "по умолчанию - шарды из настроек приложения",
+    )
+    args = parser.parse_args()
+    if args.older_than_days < 0 or args.segment_size <= 0:
+        parser.error(
+            "--older-than-days не может быть отрицательным, "
+            "--segment-size должен быть больше 0"
+        )
+
+    dsns = args.dsn or asyncpg_dsns(settings.SHARD_URLS)
+    asyncio.run(
+        archive(
+            dsns, Path(args.archive_dir), args.older_than_days,
+            args.segment_size, args.dry_run,
+        )
+    )
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
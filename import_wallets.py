@@ -0,0 +1,266 @@
+# import_wallets.py
+"""
+Массовая загрузка балансов кошельков в таблицу wallets.
+
+Строки (wallet_id, balance) читаются потоком из CSV или NDJSON,
+проверяются и пачками загружаются через COPY во временную таблицу,
+откуда переносятся одним запросом INSERT ... ON CONFLICT. При
+шардировании каждая пачка раскладывается по шардам кошельков.
+
+Загруженные балансы не попадают в историю операций: изменение баланса
+(новый минус прежний) тем же запросом добавляется
+в wallet_import_adjustments, которые учитывает сверка балансов.
+
+Примеры:
+    python import_wallets.py balances.csv
+    python import_wallets.py balances.ndjson --mode insert
+    python import_wallets.py --seed 1000000 --seed-balance 100.00
+"""
+import argparse
+import asyncio
+import sys
+import time
+import uuid
+from decimal import Decimal
+from typing import Dict, Iterator, List, Tuple
+
+import asyncpg
+
+from app.balance_files import (
+    ImportErrorLimit,
+    parse_balance,
+    read_csv,
+    read_ndjson,
+    validated_chunks,
+)
+from app.config import settings
+from app.sharding import HashRing, asyncpg_dsns, shard_names
+
+STAGING_TABLE = "wallets_staging"
+
+# Блокирует существующие кошельки пачки до конца транзакции: прежний
+# баланс, прочитанный UPSERT_SQL, не изменится до перезаписи.
+LOCK_SQL = f"""
+SELECT w.id FROM wallets w JOIN {STAGING_TABLE} s USING (id)
+ORDER BY w.id
+FOR UPDATE OF w
+"""
+
+UPSERT_SQL = f"""
+WITH previous AS (
+    SELECT w.id, w.balance FROM wallets w JOIN {STAGING_TABLE} s USING (id)
+),
+upserted AS (
+    INSERT INTO wallets (id, balance, version)
+    SELECT id, balance, 1 FROM {STAGING_TABLE}
+    ON CONFLICT (id) DO UPDATE
+        SET balance = EXCLUDED.balance, version = wallets.version + 1
+        WHERE wallets.balance IS DISTINCT FROM EXCLUDED.balance
+    RETURNING id, balance, version, xmax <> 0 AS updated
+),
+notified AS (
+    -- Работающие экземпляры приложения держат карту версий кошельков,
+    -- поэтому об измененных кошельках нужно сообщить через NOTIFY.
+    SELECT pg_notify($1, json_build_object(
+        'wallet_id', id, 'balance', balance::text, 'version', version
+    )::text)
+    FROM upserted WHERE updated
+),
+adjusted AS (
+    INSERT INTO wallet_import_adjustments (wallet_id, net_amount)
+    SELECT u.id, u.balance - coalesce(p.balance, 0)
+    FROM upserted u
+    LEFT JOIN previous p USING (id)
+    ON CONFLICT (wallet_id) DO UPDATE SET net_amount =
+        wallet_import_adjustments.net_amount + EXCLUDED.net_amount
+)
+SELECT
+    (SELECT count(*) FROM upserted WHERE NOT updated) AS inserted,
+    (SELECT count(*) FROM upserted WHERE updated) AS updated,
+    (SELECT count(*) FROM notified) AS notified
+"""
+
+INSERT_SQL = f"""
+WITH inserted AS (
+    INSERT INTO wallets (id, balance, version)
+    SELECT id, balance, 1 FROM {STAGING_TABLE}
+    ON CONFLICT (id) DO NOTHING
+    RETURNING id, balance
+),
+adjusted AS (
+    INSERT INTO wallet_import_adjustments (wallet_id, net_amount)
+    SELECT id, balance FROM inserted
+    ON CONFLICT (wallet_id) DO UPDATE SET net_amount =
+        wallet_import_adjustments.net_amount + EXCLUDED.net_amount
+)
+SELECT count(*) AS inserted, 0 AS updated FROM inserted
+"""
+
+
+def generate_seed(
+    count: int, balance: Decimal
+) -> Iterator[Tuple[int, object, object]]:
+    """Сгенерировать кошельки со случайными UUID для тестовых стендов."""
+    for line_no in range(1, count + 1):
+        yield line_no, str(uuid.uuid4()), balance
+
+
+async def load_chunk(
+    conn: asyncpg.Connection, records: List[Tuple[str, Decimal]], mode: str
+) -> Tuple[int, int]:
+    """
+    Загрузить пачку через COPY и перенести ее в wallets одним запросом.
+
+    :return: Кортеж (создано кошельков, обновлено кошельков)
+    """
+    async with conn.transaction():
+        await conn.copy_records_to_table(
+            STAGING_TABLE, records=records, columns=["id", "balance"]
+        )
+        if mode == "upsert":
+            await conn.execute(LOCK_SQL)
+            row = await conn.fetchrow(UPSERT_SQL, settings.BALANCE_CHANNEL)
+        else:
+            row = await conn.fetchrow(INSERT_SQL)
+    return row["inserted"], row["updated"]
+
+
+async def import_wallets(
+    rows: Iterator[Tuple[int, object, object]],
+    dsns: List[str],
+    mode: str,
+    chunk_size: int,
+    max_errors: int,
+    dry_run: bool,
+) -> bool:
+    """
+    Загрузить кошельки и вывести прогресс.
+
+    :param dsns: Строки подключения шардов в порядке SHARD_DATABASE_URLS
+    """
+    names = shard_names(len(dsns))
+    ring = HashRing(names)
+    conns: Dict[str, asyncpg.Connection] = {}
+
+    started = time.perf_counter()
+    total = inserted = updated = 0
+    try:
+        if not dry_run:
+            for name, dsn in zip(names, dsns):
+                conns[name] = await asyncpg.connect(dsn)
+                # Временная таблица живет до конца сессии
+                # и очищается на коммите
+                await conns[name].execute(
+                    f"CREATE TEMP TABLE {STAGING_TABLE} "
+                    "(id varchar, balance numeric(12, 2)) "
+                    "ON COMMIT DELETE ROWS"
+                )
+
+        for records in validated_chunks(rows, chunk_size, max_errors):
+            by_shard: Dict[str, List[Tuple[str, Decimal]]] = {}
+            for record in records:
+                by_shard.setdefault(ring.node_for(record[0]), []).append(
+                    record
+                )
+            for name, shard_records in by_shard.items():
+                if name not in conns:
+                    continue
+                chunk_inserted, chunk_updated = await load_chunk(
+                    conns[name], shard_records, mode
+                )
+                inserted += chunk_inserted
+                updated += chunk_updated
+            total += len(records)
+            elapsed = time.perf_counter() - started
+            print(
+                f"Обработано {total} кошельков "
+                f"(создано {inserted}, обновлено {updated}) "
+                f"за {elapsed:.1f} с, {total / max(elapsed, 1e-6):.0f} строк/с"
+            )
+    except ImportErrorLimit as e:
+        print(f"Загрузка прервана: {e}", file=sys.stderr)
+        return False
+    finally:
+        for conn in conns.values():
+            await conn.close()
+
+    print(f"Готово: {total} кошельков, создано {inserted}, обновлено {updated}")
+    return True
+
+
+def main() -> int:
+    """Основная функция."""
+    parser = argparse.ArgumentParser(
+        description="Массовая загрузка балансов кошельков"
+    )
+    parser.add_argument(
+        "path", nargs="?", help="Файл CSV или NDJSON ('-' - stdin)"
+    )
+    parser.add_argument(
+        "--format", choices=["csv", "ndjson"],
+        help="Формат файла (по умолчанию - по расширению)",
+    )
+    parser.add_argument(
+        "--mode", choices=["upsert", "insert"], default="upsert",
+        help="upsert - перезаписать баланс существующих кошельков, "
+        "insert - пропустить существующие",
+    )
+    parser.add_argument("--chunk-size", type=int, default=50_000)
+    parser.add_argument(
+        "--max-errors", type=int, default=0,
+        help="Допустимое количество некорректных строк",
+    )
+    parser.add_argument(
+        "--dry-run", action="store_true", help="Только проверить файл"
+    )
+    parser.add_argument(
+        "--seed", type=int, metavar="N",
+        help="Создать N кошельков со случайными ID вместо чтения файла",
+    )
+    parser.add_argument("--seed-balance", default="0.00")
+    parser.add_argument(
+        "--dsn", action="append",
+        help="Строка подключения (можно указать несколько - по одной на "
+        "шард); по умолчанию - шарды из настроек приложения",
+    )
+    args = parser.parse_args()
+
+    if args.seed is not None:
+        rows = generate_seed(args.seed, parse_balance(args.seed_balance))
+        stream = None
+    elif args.path:
+        try:
+            stream = (
+                sys.stdin if args.path == "-"
+                else open(args.path, newline="", encoding="utf-8")
+            )
+        except OSError as e:
+            parser.error(f"не удалось открыть {args.path}: {e.strerror}")
+        file_format = args.format or (
+            "ndjson" if args.path.endswith((".ndjson", ".jsonl")) else "csv"
+        )
+        rows = read_ndjson(stream) if file_format == "ndjson" else (
+            read_csv(stream)
+        )
+    else:
+        parser.error("укажите файл или --seed")
+
+    try:
+        success = asyncio.run(
+            import_wallets(
+                rows,
+                dsns=args.dsn or asyncpg_dsns(settings.SHARD_URLS),
+                mode=args.mode,
+                chunk_size=args.chunk_size,
+                max_errors=args.max_errors,
+                dry_run=args.dry_run,
+            )
+        )
+    finally:
+        if stream is not None and stream is not sys.stdin:
+            stream.close()
+    return 0 if success else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
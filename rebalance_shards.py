@@ -0,0 +1,297 @@
+# rebalance_shards.py
+"""
+Перенос кошельков между шардами после добавления новых шардов.
+
+Новые строки подключения добавляются в конец SHARD_DATABASE_URLS, после
+чего скрипт переносит на них кошельки (вместе с историей операций,
+итогами ее архивной части и изменениями баланса массовой загрузкой),
+которые по новому кольцу консистентного хеширования принадлежат другому
+шарду. Благодаря консистентному хешированию переезжает лишь ~1/N
+кошельков.
+
+Перенос выполняется при остановленной записи: экземпляры приложения
+переключаются на новый список шардов после завершения скрипта.
+Учтенные в статистике операции переносимых кошельков вычитаются из
+агрегатов исходного шарда и учитываются агрегатором целевого.
+Повторный запуск после сбоя безопасен: кошелек, уже скопированный на
+целевой шард, не копируется повторно, а только удаляется с исходного.
+
+Пример (было 2 шарда, добавлен третий):
+    python rebalance_shards.py --previous-count 2
+"""
+import argparse
+import asyncio
+import sys
+import time
+from typing import Dict, List
+
+import asyncpg
+
+from app.config import settings
+from app.sharding import HashRing, asyncpg_dsns, shard_names
+
+OPERATION_COLUMNS = [
+    "wallet_id", "operation_type", "amount", "balance_after", "created_at"
+]
+ARCHIVED_TOTAL_COLUMNS = ["wallet_id", "net_amount", "operations"]
+IMPORT_ADJUSTMENT_COLUMNS = ["wallet_id", "net_amount"]
+
+# Операции, уже учтенные агрегатором исходного шарда (id не больше его
+# watermark), вычитаются из его агрегатов: на целевом шарде копии
+# получают новые ID и учитываются агрегатором заново. Пары (интервал,
+# кошелек) удаляются, а active_wallets уменьшается по всем интервалам,
+# в которых у кошелька есть учтенные операции, - в том числе по
+# интервалам, пары которых уже очищены агрегатором.
+FORGET_STATS_SQL = """
+    WITH moved AS (
+        SELECT
+            g.granularity,
+            date_trunc(g.granularity, o.created_at, 'UTC') AS bucket_start,
+            o.wallet_id,
+            o.operation_type,
+            o.amount
+        FROM wallet_operations o
+        CROSS JOIN (VALUES ('hour'), ('day')) AS g (granularity)
+        WHERE o.wallet_id = ANY($1::varchar[]) AND o.id <= $2
+    ),
+    forgotten AS (
+        DELETE FROM stats_active_wallets a
+        USING moved m
+        WHERE a.granularity = m.granularity
+          AND a.bucket_start = m.bucket_start
+          AND a.wallet_id = m.wallet_id
+    ),
+    totals AS (
+        SELECT
+            granularity,
+            bucket_start,
+            count(*) FILTER (WHERE operation_type = 'DEPOSIT')
+                AS deposits_count,
+            coalesce(sum(amount) FILTER (WHERE operation_type = 'DEPOSIT'), 0)
+                AS deposits_amount,
+            count(*) FILTER (WHERE operation_type = 'WITHDRAW')
+                AS withdrawals_count,
+            coalesce(sum(amount) FILTER (WHERE operation_type = 'WITHDRAW'), 0)
+                AS withdrawals_amount,
+            count(DISTINCT wallet_id) AS active_wallets
+        FROM moved
+        GROUP BY granularity, bucket_start
+    )
+    UPDATE stats_rollups r SET
+        deposits_count = r.deposits_count - t.deposits_count,
+        deposits_amount = r.deposits_amount - t.deposits_amount,
+        withdrawals_count = r.withdrawals_count - t.withdrawals_count,
+        withdrawals_amount = r.withdrawals_amount - t.withdrawals_amount,
+        active_wallets = r.active_wallets - t.active_wallets
+    FROM totals t
+    WHERE r.granularity = t.granularity AND r.bucket_start = t.bucket_start
+"""
+
+
+async def forget_stats(source: asyncpg.Connection, ids: List[str]) -> None:
+    """
+    Исключить операции переносимых кошельков из агрегатов статистики.
+
+    Вызывается в транзакции исходного шарда до удаления операций.
+    Строка watermark блокируется до конца транзакции, чтобы агрегатор
+    не учел эти операции параллельно.
+    """
+    watermark = await source.fetchval(
+        "SELECT last_operation_id FROM stats_watermark WHERE id = 1 "
+        "FOR UPDATE"
+    )
+    if watermark:
+        await source.execute(FORGET_STATS_SQL, ids, watermark)
+
+
+async def move_wallets(
+    source: asyncpg.Connection,
+    target: asyncpg.Connection,
+    wallets: List[asyncpg.Record],
+) -> int:
+    """
+    Скопировать кошельки с историей на целевой шард.
+
+    Вызывается внутри транзакции исходного шарда, которая держит
+    блокировку строк переносимых кошельков. Удаление с исходного шарда
+    выполняет вызывающий код в той же транзакции.
+
+    :return: Количество скопированных кошельков
+    """
+    async with target.transaction():
+        inserted = await target.fetch(
+            """
+            INSERT INTO wallets (id, balance, version)
+            SELECT * FROM unnest($1::varchar[], $2::numeric[], $3::int[])
+            ON CONFLICT (id) DO NOTHING
+            RETURNING id
+            """,
+            [w["id"] for w in wallets],
+            [w["balance"] for w in wallets],
+            [w["version"] for w in wallets],
+        )
+        # Кошельки, уже существующие на целевом шарде, были скопированы
+        # прерванным запуском вместе с историей - ее не дублируем.
+        new_ids = [row["id"] for row in inserted]
+        if new_ids:
+            operations = await source.fetch(
+                f"SELECT {', '.join(OPERATION_COLUMNS)} "
+                "FROM wallet_operations WHERE wallet_id = ANY($1::varchar[]) "
+                "ORDER BY created_at, id",
+                new_ids,
+            )
+            await target.copy_records_to_table(
+                "wallet_operations",
+                records=[tuple(op) for op in operations],
+                columns=OPERATION_COLUMNS,
+            )
+            # Сегменты архива остаются на месте: чтение архива
+            # просматривает индексы всех шардов.
+            totals = await source.fetch(
+                f"SELECT {', '.join(ARCHIVED_TOTAL_COLUMNS)} "
+                "FROM wallet_archived_totals "
+                "WHERE wallet_id = ANY($1::varchar[])",
+                new_ids,
+            )
+            if totals:
+                await target.copy_records_to_table(
+                    "wallet_archived_totals",
+                    records=[tuple(total) for total in totals],
+                    columns=ARCHIVED_TOTAL_COLUMNS,
+                )
+            adjustments = await source.fetch(
+                f"SELECT {', '.join(IMPORT_ADJUSTMENT_COLUMNS)} "
+                "FROM wallet_import_adjustments "
+                "WHERE wallet_id = ANY($1::varchar[])",
+                new_ids,
+            )
+            if adjustments:
+                await target.copy_records_to_table(
+                    "wallet_import_adjustments",
+                    records=[tuple(row) for row in adjustments],
+                    columns=IMPORT_ADJUSTMENT_COLUMNS,
+                )
+    return len(new_ids)
+
+
+async def rebalance_shard(
+    name: str,
+    conns: Dict[str, asyncpg.Connection],
+    ring: HashRing,
+    batch_size: int,
+    dry_run: bool,
+) -> int:
+    """Перенести с шарда кошельки, принадлежащие теперь другим шардам."""
+    source = conns[name]
+    last_id = ""
+    scanned = moved = 0
+    started = time.perf_counter()
+    while True:
+        async with source.transaction():
+            wallets = await source.fetch(
+                "SELECT id, balance, version FROM wallets WHERE id > $1 "
+                "ORDER BY id LIMIT $2 FOR UPDATE",
+                last_id,
+                batch_size,
+            )
+            if not wallets:
+                break
+            last_id = wallets[-1]["id"]
+            scanned += len(wallets)
+
+            by_target: Dict[str, List[asyncpg.Record]] = {}
+            for wallet in wallets:
+                target = ring.node_for(wallet["id"])
+                if target != name:
+                    by_target.setdefault(target, []).append(wallet)
+
+            for target, target_wallets in by_target.items():
+                ids = [w["id"] for w in target_wallets]
+                moved += len(ids)
+                if dry_run:
+                    continue
+                await move_wallets(source, conns[target], target_wallets)
+                await forget_stats(source, ids)
+                await source.execute(
+                    "DELETE FROM wallet_operations "
+                    "WHERE wallet_id = ANY($1::varchar[])",
+                    ids,
+                )
+                await source.execute(
+                    "DELETE FROM wallet_archived_totals "
+                    "WHERE wallet_id = ANY($1::varchar[])",
+                    ids,
+                )
+                await source.execute(
+                    "DELETE FROM wallet_import_adjustments "
+                    "WHERE wallet_id = ANY($1::varchar[])",
+                    ids,
+                )
+                await source.execute(
+                    "DELETE FROM wallets WHERE id = ANY($1::varchar[])", ids
+                )
+
+        print(
+            f"{name}: просмотрено {scanned}, перенесено {moved} "
+            f"за {time.perf_counter() - started:.1f} с"
+        )
+    return moved
+
+
+async def rebalance(
+    dsns: List[str], previous_count: int, batch_size: int, dry_run: bool
+) -> bool:
+    """Перенести кошельки со всех старых шардов."""
+    names = shard_names(len(dsns))
+    ring = HashRing(names)
+    conns: Dict[str, asyncpg.Connection] = {}
+    try:
+        for name, dsn in zip(names, dsns):
+            conns[name] = await asyncpg.connect(dsn)
+        total = 0
+        for name in names[:previous_count]:
+            total += await rebalance_shard(
+                name, conns, ring, batch_size, dry_run
+            )
+    finally:
+        for conn in conns.values():
+            await conn.close()
+
+    action = "Требуется перенести" if dry_run else "Перенесено"
+    print(f"{action} кошельков: {total}")
+    return True
+
+
+def main() -> int:
+    """Основная функция."""
+    parser = argparse.ArgumentParser(
+        description="Перенос кошельков между шардами"
+    )
+    parser.add_argument(
+        "--previous-count", type=int, required=True,
+        help="Количество шардов до добавления новых",
+    )
+    parser.add_argument("--batch-size", type=int, default=1000)
+    parser.add_argument(
+        "--dry-run", action="store_true",
+        help="Только подсчитать кошельки, которые нужно перенести",
+    )
+    parser.add_argument(
+        "--dsn", action="append",
+        help="Строка подключения шарда (в порядке SHARD_DATABASE_URLS); "
+        "по умолчанию - шарды из настроек приложения",
+    )
+    args = parser.parse_args()
+
+    dsns = args.dsn or asyncpg_dsns(settings.SHARD_URLS)
+    if not 0 < args.previous_count <= len(dsns):
+        parser.error("--previous-count должен быть от 1 до числа шардов")
+
+    success = asyncio.run(
+        rebalance(dsns, args.previous_count, args.batch_size, args.dry_run)
+    )
+    return 0 if success else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,368 @@
+# reconcile.py
+"""
+Сверка балансов кошельков.
+
+Режимы:
+- по истории операций (по умолчанию): баланс каждого кошелька
+  сравнивается с суммой его операций (пополнения минус списания),
+  включая итоги перенесенных в архив операций и изменения баланса
+  массовой загрузкой (wallet_import_adjustments);
+- по внешнему файлу (--expected balances.csv): баланс сравнивается
+  с ожидаемым значением из CSV (wallet_id,balance).
+
+Пространство ключей каждого шарда делится на диапазоны wallet_id,
+которые проверяются параллельно отдельными соединениями. Все соединения
+шарда работают в одном снимке данных (pg_export_snapshot) в транзакциях
+REPEATABLE READ READ ONLY, поэтому сверка не блокирует запись и видит
+согласованное состояние. Расхождения выводятся в stdout построчно
+в формате NDJSON, сводка - в stderr; память не зависит от числа
+кошельков.
+
+Примеры:
+    python reconcile.py --workers 8
+    python reconcile.py --expected balances.csv > mismatches.ndjson
+"""
+import argparse
+import asyncio
+import json
+import sys
+import time
+from contextlib import AsyncExitStack, asynccontextmanager
+from decimal import Decimal
+from typing import AsyncIterator, Dict, List, Optional, Tuple
+
+import asyncpg
+
+from app.balance_files import read_csv, validated_chunks
+from app.config import settings
+from app.sharding import HashRing, asyncpg_dsns, shard_names
+
+# Примерное количество строк выборки на один диапазон при поиске границ
+SAMPLE_ROWS_PER_RANGE = 100
+RANGES_PER_WORKER = 4
+
+
+class Report:
+    """Потоковый вывод расхождений и счетчики для сводки."""
+
+    def __init__(self, output=sys.stdout):
+        self.output = output
+        self.checked = 0
+        self.mismatches = 0
+
+    def mismatch(
+        self,
+        shard: str,
+        wallet_id: str,
+        reason: str,
+        balance: Optional[Decimal],
+        expected: Optional[Decimal],
+    ) -> None:
+        """Записать расхождение."""
+        self.mismatches += 1
+        record = {
+            "shard": shard,
+            "wallet_id": wallet_id,
+            "reason": reason,
+            "balance": None if balance is None else str(balance),
+            "expected": None if expected is None else str(expected),
+        }
+        self.output.write(json.dumps(record) + "\n")
+        self.output.flush()
+
+
+@asynccontextmanager
+async def snapshot_connection(
+    dsn: str, snapshot: Optional[str] = None
+) -> AsyncIterator[asyncpg.Connection]:
+    """
+    Соединение в транзакции REPEATABLE READ READ ONLY.
+
+    :param snapshot: Идентификатор экспортированного снимка; если задан,
+    транзакция видит те же данные, что и транзакция-лидер
+    """
+    conn = await asyncpg.connect(dsn)
+    try:
+        await conn.execute(
+            "BEGIN ISOLATION LEVEL REPEATABLE READ READ ONLY"
+        )
+        if snapshot is not None:
+            await conn.execute(f"SET TRANSACTION SNAPSHOT '{snapshot}'")
+        yield conn
+    finally:
+        await conn.close()
+
+
+async def range_bounds(
+    conn: asyncpg.Connection, ranges: int
+) -> List[Tuple[Optional[str], Optional[str]]]:
+    """
+    Разбить пространство wallet_id на диапазоны примерно равного размера.
+
+    Границы берутся из случайной выборки страниц таблицы (TABLESAMPLE),
+    поэтому поиск не читает таблицу целиком.
+
+    :return: Список диапазонов [нижняя граница, верхняя граница),
+    None означает отсутствие границы
+    """
+    if ranges <= 1:
+        return [(None, None)]
+    estimated = await conn.fetchval(
+        "SELECT reltuples FROM pg_class WHERE oid = 'wallets'::regclass"
+    )
+    target = ranges * SAMPLE_ROWS_PER_RANGE
+    percent = 1.0 if estimated <= 0 else min(100.0, target * 100 / estimated)
+    # Выборка упорядочивается в БД: границы сравниваются в запросах по
+    # правилам сортировки БД, а они могут не совпадать с порядком строк
+    # в Python, и тогда диапазоны пересекались бы.
+    sample = [
+        row["id"]
+        for row in await conn.fetch(
+            "SELECT id FROM wallets TABLESAMPLE SYSTEM ($1) ORDER BY id",
+            percent,
+        )
+    ]
+    if len(sample) < ranges:
+        return [(None, None)]
+    step = len(sample) / ranges
+    # Индексы возрастают, поэтому повторы могут быть только соседними
+    bounds = list(
+        dict.fromkeys(sample[int(step * i)] for i in range(1, ranges))
+    )
+    edges: List[Optional[str]] = [None, *bounds, None]
+    return list(zip(edges[:-1], edges[1:]))
+
+
+def _batch_query(upper: Optional[str], first: bool) -> str:
+    # Сравнение выполняется в БД: возвращаются только расхождения
+    # и последняя строка пачки (для курсора), а не вся пачка.
+    lower_cond = "id >= $1" if first else "id > $1"
+    upper_cond = "AND id < $3" if upper is not None else ""
+    return f"""
+        WITH batch AS (
+            SELECT id, balance FROM wallets
+            WHERE {lower_cond} {upper_cond}
+            ORDER BY id
+            LIMIT $2
+        ),
+        checked AS (
+            SELECT
+                b.id,
+                b.balance,
+                h.net + coalesce(a.net_amount, 0) + coalesce(i.net_amount, 0)
+                    AS net,
+                h.operations + coalesce(a.operations, 0) AS operations
+            FROM batch b
+            CROSS JOIN LATERAL (
+                SELECT
+                    coalesce(sum(CASE WHEN o.operation_type = 'DEPOSIT'
+                        THEN o.amount ELSE -o.amount END), 0) AS net,
+                    count(*) AS operations
+                FROM wallet_operations o
+                WHERE o.wallet_id = b.id
+            ) h
+            LEFT JOIN wallet_archived_totals a ON a.wallet_id = b.id
+            LEFT JOIN wallet_import_adjustments i ON i.wallet_id = b.id
+        )
+        SELECT c.*, (SELECT count(*) FROM batch) AS batch_count
+        FROM checked c
+        WHERE c.balance <> c.net OR c.id = (SELECT max(id) FROM batch)
+        ORDER BY c.id
+    """
+
+
+async def check_range_against_history(
+    conn: asyncpg.Connection,
+    shard: str,
+    lower: Optional[str],
+    upper: Optional[str],
+    batch_size: int,
+    report: Report,
+) -> None:
+    """Сверить кошельки диапазона с суммой их операций, пачками по ключу."""
+    cursor = lower if lower is not None else ""
+    first = True
+    while True:
+        args = [cursor, batch_size]
+        if upper is not None:
+            args.append(upper)
+        rows = await conn.fetch(_batch_query(upper, first), *args)
+        if not rows:
+            return
+        for row in rows:
+            if row["balance"] == row["net"]:
+                continue
+            reason = "no_history" if row["operations"] == 0 else "mismatch"
+            report.mismatch(shard, row["id"], reason, row["balance"], row["net"])
+        report.checked += rows[0]["batch_count"]
+        cursor = rows[-1]["id"]
+        first = False
+
+
+async def reconcile_shard_history(
+    shard: str, dsn: str, workers: int, batch_size: int, report: Report
+) -> None:
+    """Параллельно сверить все диапазоны шарда в одном снимке."""
+    async with snapshot_connection(dsn) as leader:
+        snapshot = await leader.fetchval("SELECT pg_export_snapshot()")
+        # Диапазонов больше, чем воркеров: освободившийся воркер берет
+        # следующий, и неравномерность диапазонов не растягивает сверку.
+        bounds = await range_bounds(leader, workers * RANGES_PER_WORKER)
+        queue: asyncio.Queue = asyncio.Queue()
+        for bound in bounds:
+            queue.put_nowait(bound)
+
+        async def worker() -> None:
+            async with snapshot_connection(dsn, snapshot) as conn:
+                while not queue.empty():
+                    lower, upper = queue.get_nowait()
+                    await check_range_against_history(
+                        conn, shard, lower, upper, batch_size, report
+                    )
+
+        await asyncio.gather(
+            *(worker() for _ in range(min(workers, len(bounds))))
+        )
+
+
+async def check_expected_chunk(
+    conn: asyncpg.Connection,
+    shard: str,
+    chunk: List[Tuple[str, Decimal]],
+    report: Report,
+) -> None:
+    """Сверить пачку кошельков с ожидаемыми балансами."""
+    expected = dict(chunk)
+    rows = await conn.fetch(
+        "SELECT id, balance FROM wallets WHERE id = ANY($1::varchar[])",
+        list(expected),
+    )
+    found = {row["id"]: row["balance"] for row in rows}
+    for wallet_id, balance in expected.items():
+        actual = found.get(wallet_id)
+        if actual is None:
+            report.mismatch(shard, wallet_id, "missing", None, balance)
+        elif actual != balance:
+            report.mismatch(shard, wallet_id, "mismatch", actual, balance)
+    report.checked += len(expected)
+
+
+async def reconcile_expected(
+    dsns: Dict[str, str],
+    path: str,
+    workers: int,
+    batch_size: int,
+    report: Report,
+) -> None:
+    """
+    Сверить балансы с ожидаемыми значениями из CSV.
+
+    Файл читается потоком; пачки раскладываются по шардам и передаются
+    воркерам через ограниченные очереди, так что в памяти находится не
+    больше нескольких пачек на шард.
+    """
+    ring = HashRing(list(dsns))
+    queues: Dict[str, asyncio.Queue] = {
+        shard: asyncio.Queue(maxsize=workers * 2) for shard in dsns
+    }
+
+    async def worker(shard: str, snapshot: str) -> None:
+        async with snapshot_connection(dsns[shard], snapshot) as conn:
+            while True:
+                chunk = await queues[shard].get()
+                if chunk is None:
+                    return
+                await check_expected_chunk(conn, shard, chunk, report)
+
+    async def produce() -> None:
+        with open(path, newline="", encoding="utf-8") as stream:
+            for records in validated_chunks(
+                read_csv(stream), batch_size, max_errors=sys.maxsize
+            ):
+                by_shard: Dict[str, List[Tuple[str, Decimal]]] = {}
+                for record in records:
+                    by_shard.setdefault(ring.node_for(record[0]), []).append(
+                        record
+                    )
+                for shard, shard_records in by_shard.items():
+                    await queues[shard].put(shard_records)
+        for queue in queues.values():
+            for _ in range(workers):
+                await queue.put(None)
+
+    async with AsyncExitStack() as stack:
+        tasks = []
+        for shard, dsn in dsns.items():
+            leader = await stack.enter_async_context(snapshot_connection(dsn))
+            snapshot = await leader.fetchval("SELECT pg_export_snapshot()")
+            tasks += [
+                asyncio.create_task(worker(shard, snapshot))
+                for _ in range(workers)
+            ]
+        tasks.append(asyncio.create_task(produce()))
+        try:
+            await asyncio.gather(*tasks)
+        finally:
+            for task in tasks:
+                task.cancel()
+
+
+async def reconcile(
+    dsns: Dict[str, str],
+    expected: Optional[str],
+    workers: int,
+    batch_size: int,
+    report: Report,
+) -> None:
+    """Сверить все шарды и вывести сводку в stderr."""
+    started = time.perf_counter()
+    if expected:
+        await reconcile_expected(dsns, expected, workers, batch_size, report)
+    else:
+        await asyncio.gather(
+            *(
+                reconcile_shard_history(
+                    shard, dsn, workers, batch_size, report
+                )
+                for shard, dsn in dsns.items()
+            )
+        )
+    print(
+        f"Проверено кошельков: {report.checked}, "
+        f"расхождений: {report.mismatches}, "
+        f"время: {time.perf_counter() - started:.1f} с",
+        file=sys.stderr,
+    )
+
+
+def main() -> int:
+    """Основная функция."""
+    parser = argparse.ArgumentParser(description="Сверка балансов кошельков")
+    parser.add_argument(
+        "--expected", metavar="CSV",
+        help="Файл ожидаемых балансов (wallet_id,balance); по умолчанию "
+        "балансы сверяются с историей операций",
+    )
+    parser.add_argument(
+        "--workers", type=int, default=4,
+        help="Параллельных соединений на шард",
+    )
+    parser.add_argument("--batch-size", type=int, default=5000)
+    parser.add_argument(
+        "--dsn", action="append",
+        help="Строка подключения шарда (в порядке SHARD_DATABASE_URLS); "
+        "по умолчанию - шарды из настроек приложения",
+    )
+    args = parser.parse_args()
+
+    dsn_list = args.dsn or asyncpg_dsns(settings.SHARD_URLS)
+    dsns = dict(zip(shard_names(len(dsn_list)), dsn_list))
+    report = Report()
+    asyncio.run(
+        reconcile(dsns, args.expected, args.workers, args.batch_size, report)
+    )
+    return 1 if report.mismatches else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
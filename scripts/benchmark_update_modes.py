@@ -0,0 +1,131 @@
+#!/usr/bin/env python3
+"""
+Сравнение пессимистичного и оптимистичного режимов update_balance.
+
+Для каждого режима запускаются два сценария:
+- spread: каждый воркер работает со своим кошельком (низкая конкуренция)
+- hot: все воркеры обновляют один кошелек (высокая конкуренция)
+
+Режим memory выполняет те же сценарии на хранилище в памяти с журналом
+во временном каталоге и показывает, сколько стоит слой БД.
+
+Скрипт работает с БД из настроек приложения (переменные POSTGRES_*)
+и создает кошельки с префиксом bench-.
+
+Запуск: python scripts/benchmark_update_modes.py --workers 10 --operations 100
+"""
+import argparse
+import asyncio
+import statistics
+import sys
+import tempfile
+import time
+import uuid
+from contextlib import asynccontextmanager
+from decimal import Decimal
+from pathlib import Path
+from typing import AsyncIterator, List
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from app.database import AsyncSessionLocal, engine  # noqa: E402
+from app.memory_store import MemoryWalletStore  # noqa: E402
+from app.repositories.base import BaseWalletRepository  # noqa: E402
+from app.repositories.memory_repository import (  # noqa: E402
+    MemoryWalletRepository,
+)
+from app.repositories.wallet_repository import WalletRepository  # noqa: E402
+
+MODES = ("pessimistic", "optimistic", "memory")
+
+# Хранилище режима memory, открывается в main()
+memory_store: MemoryWalletStore
+
+
+@asynccontextmanager
+async def repository(mode: str) -> AsyncIterator[BaseWalletRepository]:
+    """Репозиторий для режима: своя сессия БД или общее хранилище."""
+    if mode == "memory":
+        yield MemoryWalletRepository(memory_store)
+        return
+    async with AsyncSessionLocal() as session:
+        yield WalletRepository(session, update_mode=mode)
+
+
+async def worker(
+    mode: str, wallet_id: str, operations: int, latencies: List[float]
+) -> int:
+    """Выполнить серию пополнений и вернуть количество отказов."""
+    failures = 0
+    async with repository(mode) as repo:
+        for _ in range(operations):
+            started = time.perf_counter()
+            try:
+                await repo.update_balance(wallet_id, "DEPOSIT", Decimal("1"))
+            except ValueError:
+                failures += 1
+            latencies.append(time.perf_counter() - started)
+    return failures
+
+
+async def run_scenario(
+    mode: str, scenario: str, workers: int, operations: int
+) -> None:
+    """Запустить сценарий и вывести пропускную способность и задержки."""
+    run_id = uuid.uuid4().hex[:8]
+    if scenario == "hot":
+        wallet_ids = [f"bench-{run_id}-hot"] * workers
+    else:
+        wallet_ids = [f"bench-{run_id}-{i}" for i in range(workers)]
+
+    # Кошельки создаются заранее, чтобы не мерить их создание
+    async with repository(mode) as repo:
+        for wallet_id in set(wallet_ids):
+            await repo.update_balance(wallet_id, "DEPOSIT", Decimal("1"))
+
+    latencies: List[float] = []
+    started = time.perf_counter()
+    failures = await asyncio.gather(
+        *(
+            worker(mode, wallet_id, operations, latencies)
+            for wallet_id in wallet_ids
+        )
+    )
+    elapsed = time.perf_counter() - started
+
+    latencies.sort()
+    total = workers * operations
+    p99 = latencies[int(len(latencies) * 0.99) - 1]
+    print(
+        f"{mode:<12} {scenario:<7} {total / elapsed:>9.0f} ops/s  "
+        f"p50 {statistics.median(latencies) * 1000:>7.2f} ms  "
+        f"p99 {p99 * 1000:>7.2f} ms  отказов {sum(failures)}"
+    )
+
+
+async def main() -> int:
+    """Основная функция."""
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("--workers", type=int, default=10)
+    parser.add_argument("--operations", type=int, default=100)
+    args = parser.parse_args()
+
+    print(
+        f"Воркеров: {args.workers}, операций на воркер: {args.operations}\n"
+    )
+    global memory_store
+    with tempfile.TemporaryDirectory() as directory:
+        memory_store = MemoryWalletStore(directory)
+        await memory_store.open()
+        for scenario in ("spread", "hot"):
+            for mode in MODES:
+                await run_scenario(
+                    mode, scenario, args.workers, args.operations
+                )
+        await memory_store.close()
+    await engine.dispose()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(main()))
@@ -1,11 +1,12 @@
-import asyncio
 import os
-from typing import AsyncGenerator, Generator, List
+from typing import AsyncGenerator, List
 
 import pytest
+import pytest_asyncio
 from httpx import ASGITransport, AsyncClient
+from sqlalchemy import text
 from sqlalchemy.ext.asyncio import (
-    AsyncSession, async_sessionmaker, create_async_engine
+    AsyncEngine, AsyncSession, async_sessionmaker, create_async_engine
 )
 from sqlalchemy.pool import NullPool
 
@@ -30,19 +31,20 @@ TestAsyncSessionLocal = async_sessionmaker(
 )
 
 
-@pytest.fixture(scope="session")
-def event_loop() -> Generator[asyncio.AbstractEventLoop, None, None]:
-    """Создание event loop для асинхронных тестов."""
-    loop = asyncio.new_event_loop()
-    asyncio.set_event_loop(loop)
-    yield loop
-    loop.close()
+async def truncate_tables(engine: AsyncEngine) -> None:
+    """Удалить данные из всех таблиц, не пересоздавая их."""
+    tables = ", ".join(
+        f'"{table.name}"' for table in Base.metadata.sorted_tables
+    )
+    async with engine.begin() as conn:
+        await conn.execute(text(f"TRUNCATE {tables} RESTART IDENTITY CASCADE"))
 
 
-@pytest.fixture(scope="function", autouse=True)
-async def setup_database():
-    """Создание и удаление таблиц перед и после каждого теста."""
+@pytest_asyncio.fixture(scope="session", loop_scope="session")
+async def database_schema():
+    """Создание таблиц один раз на весь запуск тестов."""
     async with test_engine.begin() as conn:
+        await conn.run_sync(Base.metadata.drop_all)
         await conn.run_sync(Base.metadata.create_all)
     print("Тестовые таблицы созданы")
 
@@ -52,14 +54,48 @@ async def setup_database():
         await conn.run_sync(Base.metadata.drop_all)
     print("Тестовые таблицы удалены")
 
-    await test_engine.dispose()
+
+def _commits_data(request: pytest.FixtureRequest) -> bool:
+    # Данные, которые должны увидеть другие соединения (несколько клиентов,
+    # LISTEN/NOTIFY, скрипты на asyncpg), нельзя держать в откатываемой
+    # транзакции.
+    return (
+        request.node.get_closest_marker("concurrent") is not None
+        or "multiple_clients" in request.fixturenames
+    )
 
 
 @pytest.fixture
-async def db_session() -> AsyncGenerator[AsyncSession, None]:
-    """Фикстура для получения сессии БД."""
-    async with TestAsyncSessionLocal() as session:
-        yield session
+async def db_session(
+    request: pytest.FixtureRequest, database_schema
+) -> AsyncGenerator[AsyncSession, None]:
+    """
+    Фикстура для получения сессии БД.
+
+    По умолчанию тест выполняется во внешней транзакции, которая
+    откатывается после теста: commit и rollback сессии работают
+    с точками сохранения (SAVEPOINT). Тесты с маркером concurrent
+    (и тесты с multiple_clients) фиксируют данные по-настоящему,
+    а после теста таблицы очищаются.
+    """
+    if _commits_data(request):
+        try:
+            async with TestAsyncSessionLocal() as session:
+                yield session
+        finally:
+            await truncate_tables(test_engine)
+        return
+
+    async with test_engine.connect() as conn:
+        transaction = await conn.begin()
+        async with AsyncSession(
+            bind=conn,
+            join_transaction_mode="create_savepoint",
+            expire_on_commit=False,
+            autoflush=False,
+        ) as session:
+            yield session
+        await transaction.rollback()
 
 
 @pytest.fixture
@@ -85,10 +121,11 @@ async def client(
 
 
 @pytest.fixture
-async def multiple_clients() -> List[AsyncClient]:
+async def multiple_clients(database_schema) -> List[AsyncClient]:
     """
     Создание нескольких независимых клиентов для конкурентных тестов.
-    Каждый клиент имеет свою собственную сессию БД.
+    Каждый клиент имеет свою собственную сессию БД; данные фиксируются,
+    после теста таблицы очищаются.
     """
     clients = []
     sessions = []
@@ -133,3 +170,4 @@ async def multiple_clients() -> List[AsyncClient]:
         await client.aclose()
     for session in sessions:
         await session.close()
+    await truncate_tables(test_engine)
@@ -0,0 +1,143 @@
+import gzip
+import io
+from datetime import datetime, timedelta, timezone
+from decimal import Decimal
+
+import pytest
+from httpx import AsyncClient
+
+from app import archive as archive_module
+from app import main
+from app.archive import ArchivedOperation, read_segment_wallet, write_segment
+from app.config import settings
+from app.repositories.wallet_repository import WalletRepository
+from app.stats import aggregate_stats
+from archive_operations import archive
+from reconcile import Report, reconcile
+from tests.conftest import TEST_DATABASE_URL, test_engine
+
+TEST_DSN = TEST_DATABASE_URL.replace("+asyncpg", "")
+
+
+def _operations(wallet_ids, per_wallet):
+    started = datetime(2026, 1, 1, tzinfo=timezone.utc)
+    operations = []
+    for wallet_id in wallet_ids:
+        for i in range(per_wallet):
+            operations.append(
+                ArchivedOperation(
+                    len(operations) + 1, wallet_id, "DEPOSIT",
+                    Decimal("1.50"), Decimal("1.50") * (i + 1),
+                    started + timedelta(minutes=i),
+                )
+            )
+    return operations
+
+
+class TestArchive:
+    """Тесты архива истории операций."""
+
+    def test_segment_blocks(self, tmp_path, monkeypatch):
+        """Чтение кошелька находит его операции в нескольких блоках."""
+        monkeypatch.setattr(archive_module, "BLOCK_ROWS", 4)
+        operations = _operations(["a", "b", "c"], per_wallet=5)
+        path = tmp_path / "shard0" / "segment.seg.gz"
+        blocks = write_segment(path, operations)
+
+        assert len(blocks) == 4
+        assert [block[0] for block in blocks] == ["a", "a", "b", "c"]
+        # Файл целиком читается обычным gzip
+        with gzip.open(path, "rt") as stream:
+            assert len(stream.readlines()) == 15
+
+        for wallet_id in ("a", "b", "c"):
+            found = read_segment_wallet(path, blocks, wallet_id)
+            assert found == [
+                op for op in operations if op.wallet_id == wallet_id
+            ]
+        assert read_segment_wallet(path, blocks, "0") == []
+        assert read_segment_wallet(path, blocks, "bb") == []
+
+    @pytest.mark.concurrent
+    async def test_archived_history(
+        self, client: AsyncClient, tmp_path, monkeypatch
+    ):
+        """Архивированная история доступна с archived=true и в сверке."""
+        monkeypatch.setattr(settings, "ARCHIVE_DIR", str(tmp_path))
+        for wallet_id in ("archive-a", "archive-b"):
+            for amount in (10.00, 20.00, 30.00):
+                response = await client.post(
+                    f"/api/v1/wallets/{wallet_id}/operation",
+                    json={"operation_type": "DEPOSIT", "amount": amount},
+                )
+                assert response.status_code == 200
+
+        # Файл прерванного запуска без строки в индексе удаляется
+        orphan = tmp_path / "shard0" / "00000000000000000001.seg.gz"
+        orphan.parent.mkdir()
+        orphan.write_bytes(b"")
+
+        # В архив попадают только операции, учтенные в статистике
+        assert await archive(
+            [TEST_DSN], tmp_path, 0, segment_size=4, dry_run=False
+        ) == 0
+        assert not orphan.exists()
+        await aggregate_stats(test_engine, 0, batch_size=100)
+        assert await archive(
+            [TEST_DSN], tmp_path, 0, segment_size=4, dry_run=False
+        ) == 6
+        assert len(list((tmp_path / "shard0").glob("*.seg.gz"))) == 2
+
+        response = await client.post(
+            "/api/v1/wallets/archive-a/operation",
+            json={"operation_type": "WITHDRAW", "amount": 5.00},
+        )
+        assert response.status_code == 200
+
+        url = "/api/v1/wallets/archive-a/operations"
+        response = await client.get(url)
+        assert [item["amount"] for item in response.json()["items"]] == [5.00]
+
+        amounts = []
+        params = {"limit": 2, "archived": "true"}
+        while True:
+            response = await client.get(url, params=params)
+            assert response.status_code == 200
+            data = response.json()
+            amounts += [item["amount"] for item in data["items"]]
+            if data["next_cursor"] is None:
+                break
+            params["cursor"] = data["next_cursor"]
+        assert amounts == [5.00, 30.00, 20.00, 10.00]
+
+        report = Report(io.StringIO())
+        await reconcile(
+            {"shard0": TEST_DSN}, None, workers=1, batch_size=10,
+            report=report,
+        )
+        assert report.checked == 2
+        assert report.mismatches == 0
+
+    async def test_archived_history_skips_duplicates(
+        self, client: AsyncClient, monkeypatch
+    ):
+        """Операция, перенесенная между чтениями, не выводится дважды."""
+        wallet_id = "archive-duplicate"
+        response = await client.post(
+            f"/api/v1/wallets/{wallet_id}/operation",
+            json={"operation_type": "DEPOSIT", "amount": 10.00},
+        )
+        assert response.status_code == 200
+
+        # Архив видит ту же операцию, что и чтение из БД
+        async def read_same(sessions, wallet_id, limit, **filters):
+            repo = WalletRepository(sessions[0])
+            return await repo.list_operations(wallet_id, limit, **filters)
+
+        monkeypatch.setattr(main, "read_archived_operations", read_same)
+        response = await client.get(
+            f"/api/v1/wallets/{wallet_id}/operations",
+            params={"archived": "true"},
+        )
+        assert response.status_code == 200
+        assert [item["amount"] for item in response.json()["items"]] == [10.0]
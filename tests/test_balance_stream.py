@@ -0,0 +1,63 @@
+import asyncio
+
+import pytest
+from httpx import AsyncClient
+
+from app.balance_stream import BalanceBroadcaster, broadcaster
+
+
+class TestBalanceStream:
+    """Тесты рассылки изменений баланса."""
+
+    def test_slow_subscriber_keeps_latest_events(self):
+        """Переполненная очередь вытесняет самые старые события."""
+        queue: asyncio.Queue = asyncio.Queue(maxsize=2)
+        for balance in ("1.00", "2.00", "3.00"):
+            BalanceBroadcaster._offer(
+                queue, {"wallet_id": "w", "balance": balance}
+            )
+
+        assert queue.qsize() == 2
+        assert queue.get_nowait()["balance"] == "2.00"
+        assert queue.get_nowait()["balance"] == "3.00"
+
+    @pytest.mark.concurrent
+    async def test_notification_on_commit(self, client: AsyncClient):
+        """Подписчик получает новый баланс после операции."""
+        wallet_id = "stream-wallet-1"
+        try:
+            async with broadcaster.subscribe(wallet_id) as queue:
+                response = await client.post(
+                    f"/api/v1/wallets/{wallet_id}/operation",
+                    json={"operation_type": "DEPOSIT", "amount": 42.50},
+                )
+                assert response.status_code == 200
+
+                event = await asyncio.wait_for(queue.get(), timeout=5)
+                assert event["wallet_id"] == wallet_id
+                assert float(event["balance"]) == 42.50
+            assert broadcaster.subscriber_count() == 0
+        finally:
+            await broadcaster.stop()
+
+    async def test_stream_nonexistent_wallet(self, client: AsyncClient):
+        """Поток для несуществующего кошелька."""
+        try:
+            response = await client.get(
+                "/api/v1/wallets/non-existent-uuid/stream"
+            )
+            assert response.status_code == 404
+        finally:
+            await broadcaster.stop()
+
+    async def test_stream_unavailable(self, client: AsyncClient, monkeypatch):
+        """Ошибка канала не раскрывается клиенту и не оставляет подписок."""
+
+        async def fail():
+            raise OSError("connection to postgres://secret@db refused")
+
+        monkeypatch.setattr(broadcaster, "start", fail)
+        response = await client.get("/api/v1/wallets/any-wallet/stream")
+        assert response.status_code == 503
+        assert response.json()["detail"] == "Balance stream is unavailable"
+        assert broadcaster.subscriber_count() == 0
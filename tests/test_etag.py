@@ -0,0 +1,108 @@
+import pytest
+from httpx import AsyncClient
+
+from app.balance_stream import broadcaster
+from app.repositories.wallet_repository import WalletRepository
+from app.version_cache import WalletVersionCache
+
+
+class TestConditionalGet:
+    """Тесты ETag и условного GET баланса."""
+
+    async def test_not_modified(self, client: AsyncClient):
+        """Повторный запрос с If-None-Match возвращает 304."""
+        wallet_id = "etag-wallet-1"
+        await client.post(
+            f"/api/v1/wallets/{wallet_id}/operation",
+            json={"operation_type": "DEPOSIT", "amount": 100.00},
+        )
+
+        response = await client.get(f"/api/v1/wallets/{wallet_id}")
+        assert response.status_code == 200
+        etag = response.headers["etag"]
+
+        response = await client.get(
+            f"/api/v1/wallets/{wallet_id}", headers={"If-None-Match": etag}
+        )
+        assert response.status_code == 304
+        assert response.headers["etag"] == etag
+        assert response.content == b""
+
+    async def test_etag_changes_after_operation(self, client: AsyncClient):
+        """После операции старый ETag не совпадает."""
+        wallet_id = "etag-wallet-2"
+        await client.post(
+            f"/api/v1/wallets/{wallet_id}/operation",
+            json={"operation_type": "DEPOSIT", "amount": 100.00},
+        )
+        response = await client.get(f"/api/v1/wallets/{wallet_id}")
+        old_etag = response.headers["etag"]
+
+        await client.post(
+            f"/api/v1/wallets/{wallet_id}/operation",
+            json={"operation_type": "WITHDRAW", "amount": 40.00},
+        )
+        response = await client.get(
+            f"/api/v1/wallets/{wallet_id}",
+            headers={"If-None-Match": old_etag},
+        )
+        assert response.status_code == 200
+        assert response.headers["etag"] != old_etag
+        assert response.json()["balance"] == 60.00
+
+    @pytest.mark.concurrent
+    async def test_not_modified_from_versions(
+        self, client: AsyncClient, monkeypatch
+    ):
+        """Пока процесс слушает уведомления, 304 отдается без БД."""
+        wallet_id = "etag-wallet-3"
+        url = f"/api/v1/wallets/{wallet_id}"
+        try:
+            await broadcaster.start()
+            assert broadcaster.is_listening
+            await client.post(
+                f"{url}/operation",
+                json={"operation_type": "DEPOSIT", "amount": 100.00},
+            )
+            response = await client.get(url)
+            etag = response.headers["etag"]
+
+            async def no_database(self, wallet_id):
+                raise AssertionError("304 must be served without the database")
+
+            with monkeypatch.context() as patch:
+                patch.setattr(WalletRepository, "get_wallet", no_database)
+                response = await client.get(
+                    url, headers={"If-None-Match": etag}
+                )
+                assert response.status_code == 304
+
+            # Версия обновляется при ответе на операцию, не дожидаясь
+            # уведомления
+            await client.post(
+                f"{url}/operation",
+                json={"operation_type": "WITHDRAW", "amount": 40.00},
+            )
+            response = await client.get(url, headers={"If-None-Match": etag})
+            assert response.status_code == 200
+            assert response.json()["balance"] == 60.00
+        finally:
+            await broadcaster.stop()
+
+    def test_version_cache_rejects_stale_reads(self):
+        """Версия, прочитанная до сброса карты, не сохраняется."""
+        cache = WalletVersionCache(max_size=2)
+        cache.update("a", 2)
+        cache.update("a", 1)
+        assert cache.get("a") == 2
+
+        generation = cache.generation
+        cache.clear()
+        cache.update("a", 3, generation)
+        assert cache.get("a") is None
+
+        cache.update("a", 1)
+        cache.update("b", 1)
+        cache.update("c", 1)
+        assert cache.get("a") is None
+        assert cache.get("c") == 1
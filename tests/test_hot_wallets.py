@@ -0,0 +1,85 @@
+from httpx import AsyncClient
+
+from app.hot_wallets import HotWalletProfiler, SpaceSaving
+
+
+class TestHotWallets:
+    """Тесты профилировщика «горячих» кошельков."""
+
+    def test_space_saving_keeps_heavy_hitters(self):
+        """Частые ключи остаются в скетче несмотря на поток редких."""
+        sketch = SpaceSaving(capacity=5)
+        for i in range(1000):
+            sketch.add("hot")
+            sketch.add(f"cold-{i}")
+
+        key, count, error = sketch.top(1)[0]
+        assert key == "hot"
+        assert count - error <= 1000 <= count
+        assert len(sketch.counts) == 5
+
+    def test_space_saving_evicts_minimum(self):
+        """Вытесняется ключ с наименьшим текущим счетчиком."""
+        sketch = SpaceSaving(capacity=3)
+        for key, weight in [("a", 5), ("b", 1), ("c", 3), ("b", 4)]:
+            sketch.add(key, weight)
+        sketch.add("d", 0.5)
+        assert sketch.counts == {"a": 5, "b": 5, "d": 3.5}
+        assert sketch.errors["d"] == 3
+        for i in range(1000):
+            sketch.add(f"cold-{i}")
+        assert len(sketch._heap) <= 4 * sketch.capacity + 1
+
+    def test_merge_never_underestimates(self):
+        """Ключ, вытесненный из окна, не получает заниженную сумму."""
+        now = [0.0]
+        profiler = HotWalletProfiler(
+            capacity=2, window_seconds=10, windows=3, clock=lambda: now[0]
+        )
+        for key in ("x", "x", "x"):
+            profiler.record_operation(key, lock_wait=0.0)
+        now[0] = 10
+        for key in ("x", "y", "y", "w", "w"):
+            profiler.record_operation(key, lock_wait=0.0)
+
+        # Во втором окне x вытеснен, но его сумма не меньше истинной
+        merged = {key: (c, e) for key, c, e in profiler.top_by_operations(10)}
+        count, error = merged["x"]
+        assert count - error <= 4 <= count
+
+    def test_profiler_drops_expired_windows(self):
+        """Операции старше скользящего интервала не учитываются."""
+        now = [0.0]
+        profiler = HotWalletProfiler(
+            capacity=10, window_seconds=10, windows=3, clock=lambda: now[0]
+        )
+        profiler.record_operation("old", lock_wait=0.5)
+        now[0] = 25
+        profiler.record_operation("new", lock_wait=0.0)
+        profiler.record_operation("new", lock_wait=0.2)
+
+        assert [k for k, _, _ in profiler.top_by_operations(10)] == [
+            "new", "old"
+        ]
+        now[0] = 35
+        assert profiler.top_by_operations(10) == [("new", 2.0, 0.0)]
+        assert profiler.top_by_lock_wait(10) == [("new", 0.2, 0.0)]
+
+    async def test_hot_wallets_endpoint(self, client: AsyncClient):
+        """Кошелек с операциями появляется в статистике и метриках."""
+        wallet_id = "hot-wallet-1"
+        for _ in range(3):
+            response = await client.post(
+                f"/api/v1/wallets/{wallet_id}/operation",
+                json={"operation_type": "DEPOSIT", "amount": 10.00},
+            )
+            assert response.status_code == 200
+
+        response = await client.get("/api/v1/admin/hot-wallets?limit=1000")
+        assert response.status_code == 200
+        hot_ids = [w["wallet_id"] for w in response.json()["by_operations"]]
+        assert wallet_id in hot_ids
+
+        response = await client.get("/metrics")
+        assert response.status_code == 200
+        assert f'wallet_id="{wallet_id}"' in response.text
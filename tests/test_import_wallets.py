@@ -0,0 +1,101 @@
+import io
+from decimal import Decimal
+
+import pytest
+from httpx import AsyncClient
+
+from app.balance_files import (
+    parse_balance,
+    read_csv,
+    read_ndjson,
+    validated_chunks,
+)
+from import_wallets import import_wallets, main
+from reconcile import Report, reconcile
+from tests.conftest import TEST_DATABASE_URL
+
+TEST_DSN = TEST_DATABASE_URL.replace("+asyncpg", "")
+
+
+class TestImportWallets:
+    """Тесты массовой загрузки кошельков."""
+
+    def test_parse_balance(self):
+        """Проверка формата баланса."""
+        assert parse_balance("10.50") == Decimal("10.50")
+        for value in ("abc", "-1", "1.234", "NaN", "1e20"):
+            with pytest.raises(ValueError):
+                parse_balance(value)
+
+    def test_validated_chunks(self):
+        """Некорректные строки пропускаются, повторы схлопываются."""
+        stream = io.StringIO(
+            "wallet_id,balance\na,1.00\nb,oops\na,2.00\nc,3\n"
+        )
+        chunks = list(validated_chunks(read_csv(stream), 10, max_errors=1))
+        assert chunks == [[("a", Decimal("2.00")), ("c", Decimal("3"))]]
+
+        stream = io.StringIO('{"wallet_id": "x", "balance": 1.5}\n')
+        chunks = list(validated_chunks(read_ndjson(stream), 10, 0))
+        assert chunks == [[("x", Decimal("1.5"))]]
+
+    def test_missing_file(self, monkeypatch, tmp_path, capsys):
+        """Недоступный файл - ошибка аргументов, а не трассировка."""
+        path = tmp_path / "missing.csv"
+        monkeypatch.setattr("sys.argv", ["import_wallets.py", str(path)])
+        with pytest.raises(SystemExit) as exc_info:
+            main()
+        assert exc_info.value.code == 2
+        assert "не удалось открыть" in capsys.readouterr().err
+
+    @pytest.mark.concurrent
+    async def test_import_and_upsert(self, client: AsyncClient):
+        """Загрузка создает кошельки, повторная - обновляет баланс."""
+        rows = [(1, "import-1", "100.00"), (2, "import-2", "5.00")]
+        assert await import_wallets(
+            iter(rows), [TEST_DSN], "upsert", chunk_size=1, max_errors=0,
+            dry_run=False,
+        )
+
+        rows = [(1, "import-1", "70.00")]
+        assert await import_wallets(
+            iter(rows), [TEST_DSN], "upsert", chunk_size=10, max_errors=0,
+            dry_run=False,
+        )
+
+        response = await client.get("/api/v1/wallets/import-1")
+        assert response.json()["balance"] == 70.00
+        response = await client.get("/api/v1/wallets/import-2")
+        assert response.json()["balance"] == 5.00
+
+    @pytest.mark.concurrent
+    async def test_import_keeps_reconcile_clean(self, client: AsyncClient):
+        """Сверка учитывает изменения балансов массовой загрузкой."""
+        rows = [(1, "import-3", "100.00")]
+        assert await import_wallets(
+            iter(rows), [TEST_DSN], "upsert", chunk_size=10, max_errors=0,
+            dry_run=False,
+        )
+        response = await client.post(
+            "/api/v1/wallets/import-3/operation",
+            json={"operation_type": "WITHDRAW", "amount": 30.00},
+        )
+        assert response.status_code == 200
+        rows = [(1, "import-3", "50.00"), (2, "import-4", "1.00")]
+        assert await import_wallets(
+            iter(rows), [TEST_DSN], "upsert", chunk_size=10, max_errors=0,
+            dry_run=False,
+        )
+        rows = [(1, "import-5", "2.00")]
+        assert await import_wallets(
+            iter(rows), [TEST_DSN], "insert", chunk_size=10, max_errors=0,
+            dry_run=False,
+        )
+
+        report = Report(io.StringIO())
+        await reconcile(
+            {"shard0": TEST_DSN}, None, workers=1, batch_size=10,
+            report=report,
+        )
+        assert report.checked == 3
+        assert report.mismatches == 0
@@ -0,0 +1,158 @@
+import asyncio
+from decimal import Decimal
+
+import pytest
+from httpx import ASGITransport, AsyncClient
+
+from app import main
+from app.config import settings
+from app.memory_store import MemoryWalletStore
+from app.repositories.memory_repository import MemoryWalletRepository
+
+
+@pytest.fixture
+async def store(tmp_path):
+    """Открытое хранилище в памяти во временном каталоге."""
+    store = MemoryWalletStore(str(tmp_path), snapshot_every=1000)
+    await store.open()
+    yield store
+    await store.close()
+
+
+async def _reopen(store: MemoryWalletStore, **kwargs) -> MemoryWalletStore:
+    reopened = MemoryWalletStore(str(store.directory), **kwargs)
+    await reopened.open()
+    return reopened
+
+
+class TestMemoryStore:
+    """Тесты хранилища балансов в памяти с журналом."""
+
+    async def test_operations(self, store):
+        """Пополнение создает кошелек, списание проверяет баланс."""
+        repo = MemoryWalletRepository(store)
+        wallet = await repo.update_balance("mem-1", "DEPOSIT", Decimal("10.50"))
+        assert wallet.balance == Decimal("10.50")
+        assert wallet.version == 1
+
+        wallet = await repo.update_balance("mem-1", "WITHDRAW", Decimal("0.50"))
+        assert wallet.balance == Decimal("10.00")
+        assert wallet.version == 2
+
+        with pytest.raises(ValueError, match="Insufficient funds"):
+            await repo.update_balance("mem-1", "WITHDRAW", Decimal("10.01"))
+        with pytest.raises(ValueError, match="Wallet not found"):
+            await repo.update_balance("mem-2", "WITHDRAW", Decimal("1"))
+        assert await repo.get_wallet("mem-2") is None
+
+    async def test_concurrent_operations(self, store):
+        """Параллельные операции не теряют обновлений."""
+        repo = MemoryWalletRepository(store)
+        await asyncio.gather(
+            *(
+                repo.update_balance(f"mem-{i % 3}", "DEPOSIT", Decimal("1"))
+                for i in range(300)
+            )
+        )
+        for i in range(3):
+            wallet = await repo.get_wallet(f"mem-{i}")
+            assert wallet.balance == Decimal("100")
+            assert wallet.version == 100
+
+    async def test_recovery_from_log(self, store):
+        """После сбоя состояние восстанавливается по журналу."""
+        repo = MemoryWalletRepository(store)
+        for _ in range(5):
+            await repo.update_balance("mem-1", "DEPOSIT", Decimal("2.25"))
+
+        # Сбой: процесс завершается без снимка, недописанная строка
+        # в конце журнала должна быть отброшена
+        segment = store._wal.segments()[-1]
+        with open(segment, "ab") as stream:
+            stream.write(b'0000beef {"lsn":6,"w":"mem-1"')
+
+        reopened = await _reopen(store)
+        try:
+            wallet = reopened.get("mem-1")
+            assert wallet.balance == Decimal("11.25")
+            assert wallet.version == 5
+            await MemoryWalletRepository(reopened).update_balance(
+                "mem-1", "DEPOSIT", Decimal("1")
+            )
+        finally:
+            await reopened.close()
+
+        reopened = await _reopen(store)
+        try:
+            assert reopened.get("mem-1").balance == Decimal("12.25")
+        finally:
+            await reopened.close()
+
+    async def test_snapshot_truncates_log(self, tmp_path):
+        """Снимок заменяет полностью вошедшие в него сегменты журнала."""
+        store = MemoryWalletStore(str(tmp_path), snapshot_every=10)
+        await store.open()
+        repo = MemoryWalletRepository(store)
+        for i in range(95):
+            await repo.update_balance(f"mem-{i % 7}", "DEPOSIT", Decimal("1"))
+        await store.close()
+
+        assert (tmp_path / "snapshot.json").exists()
+        assert len(store._wal.segments()) <= 2
+
+        reopened = await _reopen(store)
+        try:
+            total = sum(
+                reopened.get(f"mem-{i}").balance for i in range(7)
+            )
+            assert total == Decimal("95")
+        finally:
+            await reopened.close()
+
+    async def test_api_with_memory_backend(self, store, monkeypatch):
+        """API работает без PostgreSQL при STORAGE_BACKEND=memory."""
+        monkeypatch.setattr(settings, "STORAGE_BACKEND", "memory")
+        monkeypatch.setattr(main, "memory_store", store)
+        async with AsyncClient(
+            transport=ASGITransport(app=main.app), base_url="http://test"
+        ) as client:
+            response = await client.post(
+                "/api/v1/wallets/mem-api/operation",
+                json={"operation_type": "DEPOSIT", "amount": 5.5},
+            )
+            assert response.status_code == 200
+            assert response.json()["new_balance"] == 5.5
+
+            response = await client.get("/api/v1/wallets/mem-api")
+            assert response.status_code == 200
+            assert response.headers["ETag"] == '"1"'
+
+            response = await client.get("/api/v1/wallets/mem-api/operations")
+            assert response.status_code == 501
+
+    async def test_log_write_failure(self, store, monkeypatch):
+        """После ошибки записи журнала хранилище не зависает при закрытии."""
+        repo = MemoryWalletRepository(store)
+        await repo.update_balance("mem-1", "DEPOSIT", Decimal("1"))
+
+        def fail(data: bytes) -> None:
+            raise OSError("No space left on device")
+
+        monkeypatch.setattr(store._wal, "_write", fail)
+        with pytest.raises(RuntimeError):
+            await repo.update_balance("mem-1", "DEPOSIT", Decimal("1"))
+        assert not store.is_open
+        with pytest.raises(RuntimeError):
+            await store._wal.rotate()
+
+        monkeypatch.setattr(settings, "STORAGE_BACKEND", "memory")
+        monkeypatch.setattr(main, "memory_store", store)
+        async with AsyncClient(
+            transport=ASGITransport(app=main.app), base_url="http://test"
+        ) as client:
+            response = await client.get("/health")
+            assert response.json()["status"] == "unhealthy"
+            assert "No space left" in response.json()["error"]
+
+        await asyncio.wait_for(store.close(), timeout=5)
+        assert store.get("mem-1").balance == Decimal("1")
@@ -0,0 +1,79 @@
+from httpx import AsyncClient
+
+
+class TestOperationHistory:
+    """Тесты истории операций кошелька."""
+
+    async def _make_operations(self, client: AsyncClient, wallet_id: str):
+        operations = [
+            ("DEPOSIT", 100.00),
+            ("DEPOSIT", 50.00),
+            ("WITHDRAW", 30.00),
+            ("DEPOSIT", 10.00),
+            ("WITHDRAW", 20.00),
+        ]
+        for op_type, amount in operations:
+            response = await client.post(
+                f"/api/v1/wallets/{wallet_id}/operation",
+                json={"operation_type": op_type, "amount": amount},
+            )
+            assert response.status_code == 200
+
+    async def test_history_pagination(self, client: AsyncClient):
+        """Страницы по курсору покрывают всю историю без повторов."""
+        wallet_id = "history-wallet-1"
+        await self._make_operations(client, wallet_id)
+
+        items = []
+        cursor = None
+        pages = 0
+        while True:
+            params = {"limit": 2}
+            if cursor:
+                params["cursor"] = cursor
+            response = await client.get(
+                f"/api/v1/wallets/{wallet_id}/operations", params=params
+            )
+            assert response.status_code == 200
+            data = response.json()
+            items.extend(data["items"])
+            pages += 1
+            cursor = data["next_cursor"]
+            if cursor is None:
+                break
+
+        assert pages == 3
+        assert [item["amount"] for item in items] == [
+            20.00, 10.00, 30.00, 50.00, 100.00
+        ]
+        assert items[0]["balance_after"] == 110.00
+        assert len({item["id"] for item in items}) == 5
+
+    async def test_history_filter_by_type(self, client: AsyncClient):
+        """Фильтр по типу операции."""
+        wallet_id = "history-wallet-2"
+        await self._make_operations(client, wallet_id)
+
+        response = await client.get(
+            f"/api/v1/wallets/{wallet_id}/operations",
+            params={"operation_type": "WITHDRAW"},
+        )
+        assert response.status_code == 200
+        data = response.json()
+        assert [item["amount"] for item in data["items"]] == [20.00, 30.00]
+        assert data["next_cursor"] is None
+
+    async def test_history_nonexistent_wallet(self, client: AsyncClient):
+        """История несуществующего кошелька."""
+        response = await client.get(
+            "/api/v1/wallets/non-existent-uuid/operations"
+        )
+        assert response.status_code == 404
+
+    async def test_history_invalid_cursor(self, client: AsyncClient):
+        """Поврежденный курсор."""
+        response = await client.get(
+            "/api/v1/wallets/history-wallet-3/operations",
+            params={"cursor": "not-a-cursor"},
+        )
+        assert response.status_code == 400
@@ -0,0 +1,71 @@
+import logging
+from decimal import Decimal
+
+import pytest
+from sqlalchemy import text
+
+from app.query_logger import (
+    SlowQueryLogger,
+    current_wallet_id,
+    is_lock_wait,
+    redact_parameters,
+)
+from tests.conftest import test_engine
+
+
+class TestSlowQueryLogger:
+    """Тесты логгера медленных запросов."""
+
+    def test_redact_parameters(self):
+        """Значения параметров заменяются их типами."""
+        assert redact_parameters(("wallet-1", Decimal("10.00"), None)) == (
+            "<str>", "<Decimal>", "NULL"
+        )
+        assert redact_parameters({"id": "wallet-1"}) == {"id": "<str>"}
+        assert redact_parameters([(1,), (2,)]) == [("<int>",), ("<int>",)]
+
+    def test_is_lock_wait(self):
+        """Блокирующие запросы распознаются по FOR UPDATE / FOR SHARE."""
+        assert is_lock_wait("SELECT * FROM wallets WHERE id = $1 FOR UPDATE")
+        assert is_lock_wait("SELECT 1 FOR NO KEY UPDATE")
+        assert not is_lock_wait("UPDATE wallets SET balance = $1")
+
+    async def test_logs_only_slow_queries(self, caplog):
+        """Запросы дольше порога пишутся в лог с ID кошелька."""
+        sync_engine = test_engine.sync_engine
+        query_logger = SlowQueryLogger(threshold_ms=50)
+        query_logger.install(sync_engine)
+        token = current_wallet_id.set("slow-wallet")
+        try:
+            with caplog.at_level(logging.WARNING, "app.slow_queries"):
+                async with test_engine.connect() as conn:
+                    await conn.execute(text("SELECT 1"))
+                    await conn.execute(text("SELECT pg_sleep(0.1)"))
+        finally:
+            current_wallet_id.reset(token)
+            query_logger.uninstall(sync_engine)
+
+        records = [r.getMessage() for r in caplog.records]
+        assert len(records) == 1
+        assert "pg_sleep" in records[0]
+        assert "wallet_id=slow-wallet" in records[0]
+        assert "lock_wait=False" in records[0]
+
+    async def test_logs_failed_queries(self, caplog):
+        """Запрос, прерванный по таймауту, пишется в лог с ошибкой."""
+        sync_engine = test_engine.sync_engine
+        query_logger = SlowQueryLogger(threshold_ms=50)
+        query_logger.install(sync_engine)
+        try:
+            with caplog.at_level(logging.WARNING, "app.slow_queries"):
+                async with test_engine.connect() as conn:
+                    await conn.execute(text("SET statement_timeout = 100"))
+                    with pytest.raises(Exception):
+                        await conn.execute(text("SELECT pg_sleep(1)"))
+        finally:
+            query_logger.uninstall(sync_engine)
+
+        records = [r.getMessage() for r in caplog.records]
+        assert len(records) == 1
+        assert "pg_sleep" in records[0]
+        assert "error=None" not in records[0]
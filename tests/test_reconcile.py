@@ -0,0 +1,84 @@
+import io
+import json
+
+import pytest
+from httpx import AsyncClient
+from sqlalchemy import text
+
+from reconcile import Report, reconcile
+from tests.conftest import TEST_DATABASE_URL
+
+TEST_DSNS = {"shard0": TEST_DATABASE_URL.replace("+asyncpg", "")}
+
+
+async def _deposit(client: AsyncClient, wallet_id: str, amount: float):
+    response = await client.post(
+        f"/api/v1/wallets/{wallet_id}/operation",
+        json={"operation_type": "DEPOSIT", "amount": amount},
+    )
+    assert response.status_code == 200
+
+
+@pytest.mark.concurrent
+class TestReconcile:
+    """Тесты сверки балансов."""
+
+    async def test_history_mismatches(self, client: AsyncClient, db_session):
+        """Сверка с историей находит измененные в обход API балансы."""
+        for i in range(20):
+            await _deposit(client, f"reconcile-wallet-{i:02d}", 10.00)
+        await db_session.execute(
+            text(
+                "UPDATE wallets SET balance = 99 "
+                "WHERE id = 'reconcile-wallet-07'"
+            )
+        )
+        await db_session.execute(
+            text(
+                "INSERT INTO wallets (id, balance, version) "
+                "VALUES ('reconcile-imported', 5, 1)"
+            )
+        )
+        await db_session.commit()
+
+        output = io.StringIO()
+        report = Report(output)
+        await reconcile(
+            TEST_DSNS, None, workers=3, batch_size=4, report=report
+        )
+
+        mismatches = [
+            json.loads(line) for line in output.getvalue().splitlines()
+        ]
+        assert report.checked == 21
+        assert {(m["wallet_id"], m["reason"]) for m in mismatches} == {
+            ("reconcile-wallet-07", "mismatch"),
+            ("reconcile-imported", "no_history"),
+        }
+
+    async def test_expected_csv(self, client: AsyncClient, tmp_path):
+        """Сверка с файлом ожидаемых балансов."""
+        await _deposit(client, "expected-wallet-1", 10.00)
+        await _deposit(client, "expected-wallet-2", 20.00)
+        path = tmp_path / "expected.csv"
+        path.write_text(
+            "wallet_id,balance\n"
+            "expected-wallet-1,10.00\n"
+            "expected-wallet-2,25.00\n"
+            "expected-wallet-3,1.00\n"
+        )
+
+        output = io.StringIO()
+        report = Report(output)
+        await reconcile(
+            TEST_DSNS, str(path), workers=2, batch_size=2, report=report
+        )
+
+        mismatches = [
+            json.loads(line) for line in output.getvalue().splitlines()
+        ]
+        assert report.checked == 3
+        assert {(m["wallet_id"], m["reason"]) for m in mismatches} == {
+            ("expected-wallet-2", "mismatch"),
+            ("expected-wallet-3", "missing"),
+        }
@@ -0,0 +1,162 @@
+import os
+from datetime import datetime, timedelta, timezone
+from decimal import Decimal
+
+import pytest
+from sqlalchemy import func, select
+from sqlalchemy.pool import NullPool
+
+from app.database import Base
+from app.models import Operation, Wallet
+from app.repositories.wallet_repository import WalletRepository
+from app.sharding import HashRing, ShardRouter, asyncpg_dsns
+from app.stats import aggregate_stats, read_rollups
+from rebalance_shards import rebalance
+from tests.conftest import truncate_tables
+
+# Несколько тестовых баз: docker-compose --profile sharding up tests_sharding
+TEST_SHARD_URLS = [
+    url for url in os.getenv("TEST_SHARD_DATABASE_URLS", "").split(",") if url
+]
+
+requires_shards = pytest.mark.skipif(
+    len(TEST_SHARD_URLS) < 2, reason="TEST_SHARD_DATABASE_URLS не заданы"
+)
+
+
+@pytest.fixture
+async def shard_router():
+    """Маршрутизатор по тестовым шардам с чистыми таблицами."""
+    router = ShardRouter(TEST_SHARD_URLS, poolclass=NullPool)
+    # Первый шард может совпадать с основной тестовой БД, поэтому
+    # таблицы не пересоздаются, а очищаются до и после теста.
+    for engine in router.engines.values():
+        async with engine.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
+        await truncate_tables(engine)
+    yield router
+    for engine in router.engines.values():
+        await truncate_tables(engine)
+    await router.dispose()
+
+
+async def _wallet_count(router: ShardRouter, shard: str, wallet_id: str):
+    async with router.sessionmakers[shard]() as session:
+        return await session.scalar(
+            select(func.count()).where(Wallet.id == wallet_id)
+        )
+
+
+class TestSharding:
+    """Тесты шардирования кошельков."""
+
+    def test_ring_distribution(self):
+        """Ключи распределяются по шардам примерно поровну."""
+        ring = HashRing(["shard0", "shard1", "shard2"])
+        counts = {"shard0": 0, "shard1": 0, "shard2": 0}
+        for i in range(30000):
+            counts[ring.node_for(f"wallet-{i}")] += 1
+        for count in counts.values():
+            assert 7000 < count < 13000
+
+    def test_ring_moves_keys_only_to_new_shard(self):
+        """При добавлении шарда ключи переезжают только на него."""
+        old_ring = HashRing(["shard0", "shard1", "shard2"])
+        new_ring = HashRing(["shard0", "shard1", "shard2", "shard3"])
+        moved = 0
+        for i in range(20000):
+            key = f"wallet-{i}"
+            new_owner = new_ring.node_for(key)
+            if old_ring.node_for(key) != new_owner:
+                assert new_owner == "shard3"
+                moved += 1
+        assert 3000 < moved < 7000
+
+    @requires_shards
+    @pytest.mark.concurrent
+    async def test_repository_uses_wallet_shard(self, shard_router):
+        """Кошелек создается только на своем шарде."""
+        for i in range(10):
+            wallet_id = f"sharded-wallet-{i}"
+            sessionmaker = shard_router.sessionmaker_for(wallet_id)
+            async with sessionmaker() as session:
+                await WalletRepository(session).update_balance(
+                    wallet_id, "DEPOSIT", Decimal("10")
+                )
+
+            owner = shard_router.shard_for(wallet_id)
+            for shard in shard_router.names:
+                expected = 1 if shard == owner else 0
+                assert await _wallet_count(
+                    shard_router, shard, wallet_id
+                ) == expected
+
+    @requires_shards
+    @pytest.mark.concurrent
+    async def test_rebalance_after_adding_shard(self, shard_router):
+        """Кошельки с историей переезжают на новый шард по кольцу."""
+        first = shard_router.default_shard
+        wallet_ids = [f"rebalance-wallet-{i}" for i in range(30)]
+        async with shard_router.sessionmakers[first]() as session:
+            repo = WalletRepository(session)
+            for wallet_id in wallet_ids:
+                await repo.update_balance(wallet_id, "DEPOSIT", Decimal("7"))
+
+        dsns = asyncpg_dsns(TEST_SHARD_URLS)
+        assert await rebalance(
+            dsns, previous_count=1, batch_size=7, dry_run=False
+        )
+
+        moved = 0
+        for wallet_id in wallet_ids:
+            owner = shard_router.shard_for(wallet_id)
+            moved += owner != first
+            async with shard_router.sessionmakers[owner]() as session:
+                wallet = await session.get(Wallet, wallet_id)
+                assert wallet.balance == Decimal("7.00")
+                operations = await session.scalar(
+                    select(func.count()).where(
+                        Operation.wallet_id == wallet_id
+                    )
+                )
+                assert operations == 1
+            for shard in shard_router.names:
+                if shard != owner:
+                    assert await _wallet_count(
+                        shard_router, shard, wallet_id
+                    ) == 0
+        assert moved > 0
+
+    @requires_shards
+    @pytest.mark.concurrent
+    async def test_rebalance_keeps_stats(self, shard_router):
+        """Перенесенные операции учитываются в статистике один раз."""
+        first = shard_router.default_shard
+        wallet_ids = [f"rebalance-stats-wallet-{i}" for i in range(30)]
+        async with shard_router.sessionmakers[first]() as session:
+            repo = WalletRepository(session)
+            for wallet_id in wallet_ids:
+                await repo.update_balance(wallet_id, "DEPOSIT", Decimal("7"))
+        await aggregate_stats(shard_router.engines[first], 0, batch_size=100)
+
+        dsns = asyncpg_dsns(TEST_SHARD_URLS)
+        assert await rebalance(
+            dsns, previous_count=1, batch_size=7, dry_run=False
+        )
+        for engine in shard_router.engines.values():
+            await aggregate_stats(engine, 0, batch_size=100)
+
+        now = datetime.now(timezone.utc)
+        sessions = [
+            sessionmaker() for sessionmaker in shard_router.sessionmakers.values()
+        ]
+        try:
+            buckets = await read_rollups(
+                sessions, "day", now - timedelta(days=2), now + timedelta(days=1)
+            )
+        finally:
+            for session in sessions:
+                await session.close()
+        assert sum(b["deposits_count"] for b in buckets) == 30
+        assert sum(b["deposits_amount"] for b in buckets) == Decimal("210.00")
+        assert sum(b["active_wallets"] for b in buckets) == 30
@@ -0,0 +1,106 @@
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from httpx import AsyncClient
+from sqlalchemy import text
+
+from app.stats import aggregate_stats
+from tests.conftest import test_engine
+
+
+async def _operation(
+    client: AsyncClient, wallet_id: str, operation_type: str, amount: float
+):
+    response = await client.post(
+        f"/api/v1/wallets/{wallet_id}/operation",
+        json={"operation_type": operation_type, "amount": amount},
+    )
+    assert response.status_code == 200
+
+
+class TestStats:
+    """Тесты агрегированной статистики операций."""
+
+    @pytest.mark.concurrent
+    async def test_rollups_are_incremental(self, client: AsyncClient):
+        """Повторные проходы добавляют только новые операции."""
+        await _operation(client, "stats-wallet-1", "DEPOSIT", 100.00)
+        await _operation(client, "stats-wallet-1", "WITHDRAW", 30.00)
+        await _operation(client, "stats-wallet-2", "DEPOSIT", 50.00)
+        assert await aggregate_stats(test_engine, 0, batch_size=2) == 3
+        assert await aggregate_stats(test_engine, 0, batch_size=2) == 0
+
+        await _operation(client, "stats-wallet-2", "WITHDRAW", 20.00)
+        await _operation(client, "stats-wallet-3", "DEPOSIT", 5.00)
+        assert await aggregate_stats(test_engine, 0, batch_size=2) == 2
+
+        for granularity in ("hour", "day"):
+            response = await client.get(
+                "/api/v1/stats", params={"granularity": granularity}
+            )
+            assert response.status_code == 200
+            buckets = response.json()["buckets"]
+            assert len(buckets) in (1, 2)  # операции на границе интервала
+            totals = {
+                key: sum(bucket[key] for bucket in buckets)
+                for key in (
+                    "deposits_count", "deposits_amount",
+                    "withdrawals_count", "withdrawals_amount", "net_flow",
+                )
+            }
+            assert totals == {
+                "deposits_count": 3,
+                "deposits_amount": 155.00,
+                "withdrawals_count": 2,
+                "withdrawals_amount": 50.00,
+                "net_flow": 105.00,
+            }
+            if len(buckets) == 1:
+                assert buckets[0]["active_wallets"] == 3
+
+    @pytest.mark.concurrent
+    async def test_recent_operations_wait_for_lag(self, client: AsyncClient):
+        """Операции моложе lag не учитываются до следующего прохода."""
+        await _operation(client, "stats-wallet-lag", "DEPOSIT", 10.00)
+        assert await aggregate_stats(test_engine, 3600, batch_size=10) == 0
+        assert await aggregate_stats(test_engine, 0, batch_size=10) == 1
+
+    @pytest.mark.concurrent
+    async def test_delayed_transaction_is_counted(self, client: AsyncClient):
+        """Операция с меньшим ID, зафиксированная позже большей, учитывается."""
+        await _operation(client, "stats-wallet-a", "DEPOSIT", 10.00)
+        await _operation(client, "stats-wallet-b", "DEPOSIT", 10.00)
+        assert await aggregate_stats(test_engine, 0, batch_size=10) == 2
+
+        # Транзакция, задержанная, например, ожиданием блокировки:
+        # ID операции выдан раньше, чем операции, зафиксированной после.
+        async with test_engine.begin() as delayed:
+            await delayed.execute(
+                text(
+                    "INSERT INTO wallet_operations "
+                    "(wallet_id, operation_type, amount, balance_after) "
+                    "VALUES ('stats-wallet-a', 'DEPOSIT', 1, 11)"
+                )
+            )
+            await _operation(client, "stats-wallet-b", "DEPOSIT", 5.00)
+            assert await aggregate_stats(test_engine, 0, batch_size=10) == 0
+        assert await aggregate_stats(test_engine, 0, batch_size=10) == 2
+
+    async def test_range_validation(self, client: AsyncClient):
+        """Пустой и слишком длинный интервалы отклоняются."""
+        now = datetime.now(timezone.utc)
+        response = await client.get(
+            "/api/v1/stats",
+            params={"start": now.isoformat(), "end": now.isoformat()},
+        )
+        assert response.status_code == 400
+
+        response = await client.get(
+            "/api/v1/stats",
+            params={
+                "granularity": "hour",
+                "start": (now - timedelta(days=365)).isoformat(),
+                "end": now.isoformat(),
+            },
+        )
+        assert response.status_code == 400
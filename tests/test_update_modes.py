@@ -0,0 +1,70 @@
+import asyncio
+from decimal import Decimal
+
+import pytest
+from httpx import AsyncClient
+
+from app.config import settings
+from app.repositories.wallet_repository import WalletRepository
+
+
+class TestOptimisticUpdateMode:
+    """Тесты оптимистичного режима изменения баланса."""
+
+    async def test_version_increments(self, db_session):
+        """Каждая операция увеличивает версию кошелька."""
+        repo = WalletRepository(db_session, update_mode="optimistic")
+        wallet_id = "optimistic-wallet-1"
+
+        wallet = await repo.update_balance(wallet_id, "DEPOSIT", Decimal("50"))
+        assert wallet.balance == Decimal("50.00")
+        assert wallet.version == 1
+
+        wallet = await repo.update_balance(wallet_id, "WITHDRAW", Decimal("20"))
+        assert wallet.balance == Decimal("30.00")
+        assert wallet.version == 2
+
+        with pytest.raises(ValueError, match="Insufficient funds"):
+            await repo.update_balance(wallet_id, "WITHDRAW", Decimal("100"))
+
+    async def test_modes_share_version(self, db_session):
+        """Пессимистичный режим тоже увеличивает версию."""
+        wallet_id = "optimistic-wallet-2"
+        pessimistic = WalletRepository(db_session, update_mode="pessimistic")
+        optimistic = WalletRepository(db_session, update_mode="optimistic")
+
+        await pessimistic.update_balance(wallet_id, "DEPOSIT", Decimal("10"))
+        wallet = await optimistic.update_balance(
+            wallet_id, "DEPOSIT", Decimal("10")
+        )
+        assert wallet.version == 2
+        assert wallet.balance == Decimal("20.00")
+
+    @pytest.mark.asyncio
+    async def test_concurrent_optimistic_deposits(
+        self, multiple_clients, monkeypatch
+    ):
+        """Конфликты версий повторяются, и ни одно пополнение не теряется."""
+        monkeypatch.setattr(settings, "WALLET_UPDATE_MODE", "optimistic")
+        wallet_id = "optimistic-concurrent-wallet"
+        first_client = multiple_clients[0]
+
+        response = await first_client.post(
+            f"/api/v1/wallets/{wallet_id}/operation",
+            json={"operation_type": "DEPOSIT", "amount": 100.00},
+        )
+        assert response.status_code == 200
+
+        async def make_deposit(client: AsyncClient):
+            return await client.post(
+                f"/api/v1/wallets/{wallet_id}/operation",
+                json={"operation_type": "DEPOSIT", "amount": 10.00},
+            )
+
+        responses = await asyncio.gather(
+            *(make_deposit(client) for client in multiple_clients[1:5])
+        )
+        assert [r.status_code for r in responses] == [200] * 4
+
+        response = await first_client.get(f"/api/v1/wallets/{wallet_id}")
+        assert response.json()["balance"] == 140.00